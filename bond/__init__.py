@@ -1,10 +1,16 @@
+import collections
+import importlib
+import itertools
 import json
 import os
-import pexpect
-import pkg_resources
 import re
+import signal
 import sys
+import threading
+import time
 import tty
+import weakref
+from bond import framings
 from bond import protocols
 
 try:
@@ -14,32 +20,20 @@ except ImportError:
 
 
 # Host constants
-LANG  = 'Python'           # Identity language
-PROTO = ['PICKLE', 'JSON'] # Supported protocols, in order of preference
+LANG    = 'Python'           # Identity language
+PROTO   = ['PICKLE', 'JSON'] # Supported protocols, in order of preference
+FRAMING = ['BINARY', 'LINE'] # Supported message framings, in order of preference
 
+# Commands running the interpreter on a different host
+REMOTE_SHELLS = ['ssh', 'rsh']
 
-# pexpect helper
-class Spawn(pexpect.spawn):
-    def __init__(self, *args, **kwargs):
-        kwargs.setdefault('env', {})['TERM'] = 'dumb'
-        super(Spawn, self).__init__(*args, **kwargs)
-        tty.setraw(self.child_fd)
+# Default number of calls sent in a single batch by call_many()
+BATCH_SIZE = 1000
 
-    def noecho(self):
-        self.setecho(False)
-        self.waitnoecho()
-
-    def sendline_noecho(self, *args, **kwargs):
-        self.noecho()
-        return self.sendline(*args, **kwargs)
-
-    def expect_noecho(self, *args, **kwargs):
-        self.noecho()
-        return self.expect(*args, **kwargs)
-
-    def expect_exact_noecho(self, *args, **kwargs):
-        self.noecho()
-        return self.expect_exact(*args, **kwargs)
+# Protocols requiring a binary-safe framing
+BINARY_PROTO = ['PICKLE5']
+if hasattr(protocols, 'PICKLE5'):
+    PROTO.insert(0, 'PICKLE5')
 
 
 # Our exceptions
@@ -59,6 +53,13 @@ class TerminatedException(BondException):
     def __str__(self):
         return "TerminatedException[{lang}]: {msg}".format(lang=self.lang, msg=self.error)
 
+class CallTimeout(BondException):
+    def __init__(self, lang, error):
+        super(CallTimeout, self).__init__(lang, error)
+
+    def __str__(self):
+        return "CallTimeout[{lang}]: {msg}".format(lang=self.lang, msg=self.error)
+
 class SerializationException(BondException, TypeError):
     def __init__(self, lang, error, side):
         self.side = side
@@ -82,74 +83,440 @@ class Ref(object):
     def __init__(self, bond, code):
         self.bond = bond
         self.code = code
+        self._slot = None           # remote slot holding the compiled code
+        self._registered = False
+
+class RemoteHandle(object):
+    def __init__(self, bond, id, value=None):
+        '''A value kept by the interpreter of "bond" in the slot "id" (see
+        ``Bond.call()``). When not supported by the driver, "id" is None and
+        the value is kept locally instead.'''
+        self.bond = bond
+        self.id = id
+        self._value = value
+
+    def fetch(self):
+        '''Return a copy of the value'''
+        if self.id is None:
+            return self._value
+        return self.bond._handle('fetch', self.id)
+
+    def __getitem__(self, key):
+        if self.id is None:
+            return self._value[key]
+        return self.bond._handle('getitem', self.id, key)
+
+    def __repr__(self):
+        return "<RemoteHandle[{lang}] {id}>".format(lang=self.bond.lang, id=self.id)
+
+# Performance counters
+_timer = getattr(time, 'perf_counter', time.time)
+
+class _Stats(object):
+    # updates are queued without locking (appending to a deque is atomic),
+    # and summed up when reading the counters or once enough are queued
+    COUNTERS = ['calls', 'evals', 'bytes_sent', 'bytes_received', 'dumps_time',
+                'loads_time', 'wait_time', 'max_depth']
+    MAX_QUEUED = 4096
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.callbacks = {}
+        self.queue = collections.deque()
+
+    def add(self, key, value):
+        self.queue.append((key, value))
+        if len(self.queue) > self.MAX_QUEUED:
+            self.update()
+
+    def callback(self, name, elapsed):
+        # exported functions are told apart from counters by a tuple key
+        self.add((name,), elapsed)
+
+    def update(self):
+        with self.lock:
+            counters = self.counters
+            queue = self.queue
+            for i in range(len(queue)):
+                key, value = queue.popleft()
+                if key.__class__ is tuple:
+                    entry = self.callbacks.get(key[0])
+                    if entry is None:
+                        entry = self.callbacks[key[0]] = [0, 0]
+                    entry[0] += 1
+                    entry[1] += value
+                else:
+                    counters[key] += value
+
+# requests counted as calls or evaluations
+_REQUESTS = {'CALL': 'calls', 'XCALL': 'calls', 'EVAL': 'evals', 'EVAL_BLOCK': 'evals'}
+
+# all the live bonds, for stats()
+_bonds = weakref.WeakSet()
+_bonds_lock = threading.Lock()
+
 
 class Bond(object):
-    def __init__(self, proc, trans_except, lang='<unknown>', proto=protocols.JSON):
+    _reader_type = framings.Reader
+
+    def __init__(self, proc, trans_except, lang='<unknown>', proto=protocols.JSON,
+                 framing=framings.LINE, shm=None, features=(), startup=None):
         '''Construct a bond using an pre-initialized interpreter.
         Use ``bond.make_bond()`` to initialize it using a language driver.
 
         "proc": a pexpect object, with an open communication to a bond driver
         "trans_except": local behavior for transparent exceptions
         "lang": language name
-        "proto": serialization object supporting "dumps/loads"'''
+        "proto": serialization object supporting "dumps/loads"
+        "framing": message framing object supporting "send/recv"
+        "shm": optional ``framings.SharedMemory`` side channel
+        "features": optional protocol features supported by the driver
+        "startup": optional time spent in each initialization phase'''
 
         self.channels = {'STDOUT': sys.stdout, 'STDERR': sys.stderr}
         self.bindings = {}
         self.trans_except = trans_except
         self._proc = proc
+        self._reader = self._reader_type(proc)
         self.lang = lang
         self._proto = proto
+        self._framing = framing
+        self._shm = shm
+        self._features = frozenset(features)
+        self.startup = startup or {}
+
+        # Requests can be pipelined, so we keep track of the interpreter's
+        # state: "_inq" holds the request futures (or None for replies to its
+        # calls) written but not read yet, "_stack" the requests being
+        # evaluated, and "_reading" is set when it's waiting for input.
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._inq = collections.deque()
+        self._stack = []
+        self._reading = True
+        self._owner = None      # thread reading replies
+        self._callbacks = 0     # exported functions being evaluated
+        self._deferred = []     # requests held back during callbacks
+
+        # threads waiting for the reader role, and exported functions handed
+        # over to them
+        self._cond = threading.Condition(self._lock)
+        self._waiting = set()
+        self._handoff = {}
+
+        # remote slots of the live handles and references, and the slots to
+        # be released
+        self._slots_lock = threading.Lock()
+        self._handles = {}
+        self._refs = {}
+        self._refs_id = 0
+        self._released = collections.deque()
+
+        # bindings proxied from bonds using the same protocol, whose calls
+        # are relayed without decoding ("relayed" counts the bytes)
+        self._relays = {}
+        self.relayed = 0
+
+        # channels replaced by redirect()
+        self._redirects = {}
+
+        self._stats = _Stats()
+        with _bonds_lock:
+            _bonds.add(self)
 
 
     def loads(self, *args):
-        return self._proto.loads(*args)
+        start = _timer()
+        try:
+            return self._proto.loads(*args)
+        finally:
+            self._stats.add('loads_time', _timer() - start)
 
     def dumps(self, *args):
+        proto = self._proto
+        start = _timer()
         try:
-            return self._proto.dumps(*args)
+            return proto.dumps(*args)
         except Exception as e:
             raise SerializationException(self.lang, str(e), 'local')
+        finally:
+            self._stats.add('dumps_time', _timer() - start)
 
 
     def _sendstate(self, cmd, code):
-        ret = bytes(cmd.encode('ascii')) + b' ' + code
-        self._proc.sendline(ret)
-
-    def _repl(self):
-        while self._proc.expect_exact(b'\n') == 0:
-            line = self._proc.before.split(b' ', 1)
-            cmd = line[0].decode('ascii')
-            args = self.loads(line[1]) if len(line) > 1 else []
-
-            # interpret the serial protocol
-            if cmd == "RETURN":
-                return args
-            elif cmd == "OUTPUT":
-                self.channels[args[0]].write(args[1])
-                continue
-            elif cmd == "EXCEPT":
-                raise RemoteException(self.lang, str(args), args)
-            elif cmd == "ERROR":
-                raise SerializationException(self.lang, str(args), 'remote')
-            elif cmd == "BYE":
-                raise TerminatedException(self.lang, str(args))
-            elif cmd == "CALL":
-                ret = None
-                state = "RETURN"
+        self._framing.send(self._proc, *self._outstate(cmd, code))
+
+    def _outstate(self, cmd, code):
+        # account for an outgoing message, moving a large payload to shared
+        # memory
+        if cmd in _REQUESTS:
+            self._stats.add(_REQUESTS[cmd], 1)
+        size = framings.size(code)
+        self._stats.add('bytes_sent', size)
+        if self._shm is not None and size >= self._shm.threshold:
+            cmd, code = 'SHM', self._shm.dump(cmd, code)
+        return cmd, code
+
+    def _recvstate(self):
+        cmd, code = self._framing.recv(self._reader)
+        if cmd == "SHM" and self._shm is not None:
+            cmd, code = self._shm.load(code)
+        if code is not None:
+            self._stats.add('bytes_received', len(code))
+        return cmd, code
+
+    def _exception(self, cmd, args):
+        if cmd == "EXCEPT":
+            return RemoteException(self.lang, str(args), args)
+        elif cmd == "ERROR":
+            return SerializationException(self.lang, str(args), 'remote')
+        elif cmd == "BYE":
+            return TerminatedException(self.lang, str(args))
+        return BondException(self.lang, 'unknown interpreter state')
+
+    def _reply_state(self, state, ret):
+        try:
+            code = self.dumps(ret)
+        except SerializationException as e:
+            state = "ERROR"
+            code = self.dumps(str(e))
+        return state, code
+
+    def _outstanding(self):
+        return bool(self._deferred or any(self._stack) or any(self._inq))
+
+    def _request(self, cmd, code, wait=True, raw=False):
+        from concurrent.futures import Future
+        fut = Future()
+        if raw:
+            # the reply is returned as (state, payload) without decoding
+            fut._raw = True
+        if wait:
+            # the issuing thread is going to wait for the reply
+            fut._thread = threading.current_thread()
+        with self._write_lock:
+            with self._lock:
+                if self._callbacks and self._owner is not threading.current_thread():
+                    # keep the strict request/response order during callbacks
+                    self._deferred.append((fut, cmd, code))
+                    return fut
+                released = {}
+                while self._released:
+                    op, id = self._released.popleft()
+                    released.setdefault(op, []).append(id)
+                for op in released:
+                    # the reply is simply discarded
+                    self._inq.append(Future())
+                self._inq.append(fut)
+            for op, ids in released.items():
+                self._sendstate('HANDLE', self.dumps([op, ids]))
+            self._sendstate(cmd, code)
+        return fut
+
+    def _wait(self, fut, timeout=None):
+        me = threading.current_thread()
+        with self._lock:
+            # nested requests leave the reader role to the outer one (we can
+            # also be handed a callback before waiting)
+            outer = self._owner is not me or me in self._handoff
+        deadline = time.time() + timeout if timeout is not None else None
+        try:
+            self._serve(me, fut.done, deadline, fut)
+        finally:
+            if outer:
+                with self._lock:
+                    if self._owner is me:
+                        self._handover()
+        if not fut.done():
+            raise CallTimeout(self.lang,
+                              'no reply within {timeout} seconds'.format(timeout=timeout))
+        return fut.result()
+
+    def _serve(self, me, done, deadline=None, fut=None):
+        # read messages until "done" (called with the lock held) is true or
+        # "deadline" expires, waiting while another thread is the reader.
+        # Exported functions called because of our request "fut" are handed
+        # back to us while we wait for it.
+        while True:
+            with self._lock:
+                remaining = None
+                while True:
+                    call = self._handoff.pop(me, None)
+                    if call is not None or done():
+                        break
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                    if self._owner is None:
+                        self._owner = me
+                    if self._owner is me:
+                        break
+                    self._waiting.add(me)
+                    self._cond.wait(remaining)
+                    self._waiting.discard(me)
+                if call is None and (done() or remaining is not None and remaining <= 0):
+                    if fut is not None:
+                        fut._thread = None
+                    if self._owner is None and not self._waiting and self._outstanding():
+                        self._handover()
+                    return
+            if call is not None:
+                self._callback(*call)
+            elif remaining is None:
+                self._pump()
+            else:
+                start = _timer()
+                ready = self._reader.ready(remaining)
+                self._stats.add('wait_time', _timer() - start)
+                if ready:
+                    self._pump()
+
+    def _handover(self):
+        # hand over the reader role to a waiting thread, or any request still
+        # in flight to a background reader (called with the lock held)
+        self._owner = None
+        if self._waiting:
+            self._cond.notify_all()
+        elif self._outstanding():
+            reader = threading.Thread(target=self._background)
+            reader.daemon = True
+            reader.start()
+
+    def _background(self):
+        me = threading.current_thread()
+        try:
+            self._serve(me, lambda: not self._outstanding())
+        except Exception as e:
+            with self._lock:
+                futs = [x for x in self._stack + list(self._inq) if x is not None]
+                futs.extend(x[0] for x in self._deferred)
+                self._deferred = []
+            for fut in futs:
+                if not fut.done():
+                    fut.set_exception(e)
+            with self._lock:
+                if self._owner is me:
+                    self._owner = None
+                self._cond.notify_all()
+        else:
+            with self._lock:
+                # requests issued since the last reply was read
+                if self._owner is me:
+                    self._handover()
+
+    def _pump(self):
+        # read and interpret a single message from the interpreter
+        start = _timer()
+        cmd, code = self._recvstate()
+        self._stats.add('wait_time', _timer() - start)
+        if cmd == "OUTPUT":
+            args = self.loads(code)
+            self.channels[args[0]].write(args[1])
+            return
+        with self._lock:
+            # the input read by the interpreter before answering
+            while self._reading and self._inq:
+                fut = self._inq.popleft()
+                if fut is not None:
+                    self._stack.append(fut)
+                self._reading = False
+            if self._reading or not self._stack:
+                raise BondException(self.lang, 'unknown interpreter state')
+            self._reading = True
+            if cmd == "CALL":
+                depth = len(self._stack)
+                self._callbacks += 1
+                if self._callbacks > self._stats.counters['max_depth']:
+                    self._stats.counters['max_depth'] = self._callbacks
+                # run the function in the thread waiting for the request
+                thread = getattr(self._stack[-1], '_thread', None)
+                if thread is not None and thread is not threading.current_thread():
+                    self._owner = thread
+                    self._handoff[thread] = (code, depth)
+                    self._cond.notify_all()
+                    return
+            else:
+                fut = self._stack.pop()
+        if cmd == "CALL":
+            return self._callback(code, depth)
+
+        # any other state terminates the innermost request (whose reply might
+        # be simply discarded after a timeout)
+        try:
+            if getattr(fut, '_raw', False) and cmd in ("RETURN", "EXCEPT", "ERROR"):
+                args = (cmd, code)
+            else:
+                args = self.loads(code) if code is not None else []
+                if cmd != "RETURN":
+                    raise self._exception(cmd, args)
+        except Exception as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(args)
+        with self._lock:
+            if self._waiting:
+                self._cond.notify_all()
+
+    def _relay(self, code):
+        # forward a call to a proxied function as-is, returning the raw reply
+        # (or None if "code" is not such a call)
+        name, args = self._proto.split(code)
+        target = self._relays.get(name)
+        if target is None:
+            return None
+        other, remote = target
+        start = _timer()
+        state, ret = other._wait(other._request('CALL', other._proto.join(remote, args), raw=True))
+        self._stats.callback(name, _timer() - start)
+        with self._lock:
+            self.relayed += len(code) + len(ret)
+        if state == "ERROR":
+            # the result couldn't be serialized: the caller gets the same
+            # exception as for a regular proxy
+            e = other._exception(state, other.loads(ret))
+            state, ret = self._reply_state("EXCEPT", e if self.trans_except else str(e))
+        return state, ret
+
+    def _callback(self, code, depth):
+        ret = None
+        state = "RETURN"
+        relay = None
+        try:
+            if self._relays:
+                relay = self._relay(code)
+            if relay is None:
+                args = self.loads(code)
+                start = _timer()
                 try:
                     ret = self.bindings[args[0]](*args[1])
-                except Exception as e:
-                    state = "EXCEPT"
-                    ret = e if self.trans_except else str(e)
-                try:
-                    code = self.dumps(ret)
-                except SerializationException as e:
-                    state = "ERROR"
-                    code = self.dumps(str(e))
-                self._sendstate(state, code)
-                continue
-
-            raise BondException(self.lang, 'unknown interpreter state')
+                finally:
+                    self._stats.callback(args[0], _timer() - start)
+        except Exception as e:
+            state = "EXCEPT"
+            ret = e if self.trans_except else str(e)
+        if relay is not None:
+            state, code = relay
+        else:
+            state, code = self._reply_state(state, ret)
+
+        # pipelined requests read by the interpreter while waiting for our
+        # reply are evaluated first
+        self._serve(threading.current_thread(), lambda: self._reading and
+                    not self._inq and len(self._stack) == depth)
+
+        with self._write_lock:
+            with self._lock:
+                self._inq.append(None)
+                self._callbacks -= 1
+                deferred = []
+                if not self._callbacks:
+                    deferred, self._deferred = self._deferred, []
+                    self._inq.extend(x[0] for x in deferred)
+            self._sendstate(state, code)
+            for fut, cmd, code in deferred:
+                self._sendstate(cmd, code)
 
 
     def _data(self, maybe_ref):
@@ -169,45 +536,301 @@ class Bond(object):
 
     def eval(self, code):
         '''Evaluate and return the value of a single statement of code in the interpreter.'''
-        self._sendstate('EVAL', self.dumps(self._data(code)))
-        return self._repl()
+        return self._wait(self._request('EVAL', self.dumps(self._data(code))))
 
     def eval_block(self, code):
         '''Evaluate a "code" block inside the interpreter. Nothing is returned.'''
-        self._sendstate('EVAL_BLOCK', self.dumps(self._data(code)))
-        return self._repl()
+        return self._wait(self._request('EVAL_BLOCK', self.dumps(self._data(code))))
+
+    def _xarg(self, arg):
+        if isinstance(arg, Ref) and 'REF' in self._features:
+            code = self._data(arg)
+            if arg._registered:
+                return [3, arg._slot]
+            if arg._slot is None:
+                self._register(arg)
+            return [3, arg._slot, code]
+        if not isinstance(arg, RemoteHandle):
+            return [int(isinstance(arg, Ref)), self._data(arg)]
+        if arg.id is None:
+            return [0, arg._value]
+        if arg.bond is self:
+            return [2, arg.id]
+        raise BondException(self.lang, 'cannot use a handle coming from a different bond')
+
+    def _call_state(self, name, args):
+        if not any(isinstance(arg, (Ref, RemoteHandle)) for arg in args):
+            return 'CALL', self.dumps([name, args])
+        xargs = [self._xarg(arg) for arg in args]
+        return 'XCALL', self.dumps([name, xargs])
+
+    def _register(self, ref):
+        # references get a slot the first time they're used in a call: the
+        # code is sent along until the interpreter replied once
+        with self._slots_lock:
+            if ref._slot is not None:
+                return
+            self._refs_id += 1
+            id = ref._slot = self._refs_id
+        self._refs[id] = weakref.ref(ref, lambda r: self._release(self._refs, 'unref', id))
+
+    def _registered(self, args):
+        for arg in args:
+            if isinstance(arg, Ref) and arg._slot is not None:
+                arg._registered = True
+
+    def _handle(self, *args):
+        return self._wait(self._request('HANDLE', self.dumps(list(args))))
+
+    def _release(self, slots, op, id):
+        # called when a handle or a reference is garbage collected: the slot
+        # is released along with the next request
+        del slots[id]
+        self._released.append((op, id))
+
+    def _call(self, request, name, args):
+        fut = request(*self._call_state(name, args))
+        if 'REF' in self._features:
+            fut.add_done_callback(lambda fut: self._registered(args))
+        return fut
+
+    def _interrupt(self, fut):
+        # interrupt "fut" only when it's the request being evaluated
+        if 'INTERRUPT' not in self._features:
+            return False
+        with self._write_lock:
+            with self._lock:
+                if list(self._inq) != [fut] and \
+                   (self._inq or not self._stack or self._stack[-1] is not fut):
+                    return False
+            self.interrupt()
+        return True
+
+    def _timed(self, fut, timeout):
+        # wait for "fut" up to "timeout" seconds, then interrupt it if
+        # possible or leave its reply to be discarded
+        if timeout is None:
+            return self._wait(fut)
+        try:
+            return self._wait(fut, timeout)
+        except CallTimeout:
+            if not self._interrupt(fut):
+                raise
+        try:
+            return self._wait(fut, timeout)
+        except RemoteException:
+            raise CallTimeout(self.lang,
+                              'interrupted after {timeout} seconds'.format(timeout=timeout))
+
+    def call(self, name, *args, **kwargs):
+        '''Call a function "name" using *args (apply *args to a callable statement "name").
+        If "by_ref" is true, the result is kept by the interpreter, returning
+        a ``RemoteHandle`` to it instead. If "timeout" is given, raise
+        ``CallTimeout`` when no reply is received within as many seconds.'''
+        by_ref = kwargs.pop('by_ref', False)
+        timeout = kwargs.pop('timeout', None)
+        if kwargs:
+            raise TypeError('unexpected keyword argument "{name}"'.format(name=next(iter(kwargs))))
+        if not by_ref:
+            return self._timed(self._call(self._request, name, args), timeout)
+        if 'HANDLE' not in self._features:
+            return RemoteHandle(self, None, self.call(name, *args, timeout=timeout))
+        fut = self._request('HANDLE', self.dumps(['call', name, [self._xarg(arg) for arg in args]]))
+        try:
+            id = self._timed(fut, timeout)
+        except CallTimeout:
+            def release(fut):
+                # the value might be stored anyway
+                if fut.exception() is None:
+                    self._released.append(('release', fut.result()))
+            fut.add_done_callback(release)
+            raise
+        return self._new_handle(id)
+
+    def _new_handle(self, id):
+        handle = RemoteHandle(self, id)
+        self._handles[id] = weakref.ref(
+            handle, lambda ref: self._release(self._handles, 'release', id))
+        return handle
+
+    def _submit(self, cmd, code):
+        fut = self._request(cmd, code, wait=False)
+        with self._lock:
+            if self._owner is None:
+                self._handover()
+        return fut
+
+    def call_async(self, name, *args):
+        '''Call a function "name" using *args without waiting for its result,
+        returning a ``concurrent.futures.Future``. Requests are pipelined, while
+        replies are collected in order by a background thread.'''
+        return self._call(self._submit, name, args)
+
+    def call_many(self, name, args, chunksize=BATCH_SIZE):
+        '''Call a function "name" once for each tuple of arguments in "args",
+        returning the list of results. Remote exceptions raised by individual
+        calls are returned in place of their result. Calls are sent in batches
+        of "chunksize" when supported by the driver, or pipelined otherwise.'''
+        args = iter(args)
+        futs = []
+        while True:
+            chunk = [tuple(xargs) for xargs in itertools.islice(args, chunksize)]
+            if not chunk:
+                break
+            if 'BATCH' in self._features and \
+               not any(isinstance(arg, (Ref, RemoteHandle)) for xargs in chunk for arg in xargs):
+                futs.append((True, self._submit('BATCH', self.dumps([name, chunk]))))
+                self._stats.add('calls', len(chunk))
+            else:
+                futs.extend((False, self.call_async(name, *xargs)) for xargs in chunk)
 
-    def call(self, name, *args):
-        '''Call a function "name" using *args (apply *args to a callable statement "name")'''
-        if not any(isinstance(arg, Ref) for arg in args):
-            self._sendstate('CALL', self.dumps([name, args]))
+        ret = []
+        for batch, fut in futs:
+            if batch:
+                for state, value in fut.result():
+                    ret.append(value if state == "RETURN" else self._exception(state, value))
+                continue
+            try:
+                ret.append(fut.result())
+            except (RemoteException, SerializationException) as e:
+                ret.append(e)
+        return ret
+
+    def stats(self):
+        '''Return a snapshot of the performance counters of this bond'''
+        self._stats.update()
+        with self._stats.lock:
+            ret = dict(self._stats.counters)
+            callbacks = dict((name, {'calls': calls, 'time': elapsed})
+                             for name, (calls, elapsed) in self._stats.callbacks.items())
+        ret.update({'lang': self.lang, 'pid': getattr(self._proc, 'pid', None),
+                    'depth': self._callbacks, 'relayed': self.relayed,
+                    'callbacks': callbacks, 'startup': dict(self.startup)})
+        return ret
+
+    def interrupt(self):
+        '''Interrupt the evaluation of the current request, which then fails
+        with a ``RemoteException``. Only supported by local interpreters.'''
+        if 'INTERRUPT' not in self._features:
+            raise BondException(self.lang, 'interrupt is not supported by this bond')
+        os.kill(self._proc.pid, signal.SIGINT)
+
+    def redirect(self, chan, path=None):
+        '''Write the output of "chan" ("STDOUT" or "STDERR") to the file "path"
+        (``os.devnull`` to discard it), or back to ``channels`` if None. When
+        supported by the driver, the file is written by the interpreter itself
+        and the output is not sent to Python.'''
+        if 'REDIRECT' in self._features:
+            if path is not None:
+                path = os.path.abspath(path)
+            self._wait(self._request('REDIRECT', self.dumps([chan, path])))
+        else:
+            self._redirect(chan, path)
+
+    def _redirect(self, chan, path):
+        # the output is still received, but written to the file locally
+        if chan not in self.channels:
+            raise BondException(self.lang, 'unknown channel "{chan}"'.format(chan=chan))
+        if path is not None:
+            stream = open(path, 'a', 1)
         else:
-            xargs = []
-            for arg in args:
-                xargs.append([int(isinstance(arg, Ref)), self._data(arg)])
-            self._sendstate('XCALL', self.dumps([name, xargs]))
-        return self._repl()
+            stream = self._redirects.get(chan, self.channels[chan])
+        old = self.channels[chan]
+        if chan in self._redirects:
+            old.close()
+        else:
+            self._redirects[chan] = old
+        if path is None:
+            del self._redirects[chan]
+        self.channels[chan] = stream
 
     def close(self):
         '''Terminate the underlying interpreter'''
         self._proc.sendeof()
 
+    def fork(self):
+        '''Fork the interpreter, returning a new ``Bond`` connected to a copy of
+        its current state. Requires a local interpreter and driver support.'''
+        if 'FORK' not in self._features:
+            raise BondException(self.lang, 'fork is not supported by this bond')
+
+        import shutil
+        import socket
+        import tempfile
+        from bond.transports import Socket
+
+        # the child connects back to a private socket
+        path = tempfile.mkdtemp(prefix='bond-')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(os.path.join(path, 'fork'))
+            listener.listen(1)
+            listener.settimeout(self._proc.timeout)
+            pid = self._wait(self._request('FORK', self.dumps(os.path.join(path, 'fork'))))
+            try:
+                sock = listener.accept()[0]
+            except socket.timeout:
+                raise BondException(self.lang, 'forked interpreter did not connect')
+        finally:
+            listener.close()
+            shutil.rmtree(path)
+        sock.setblocking(True)
+
+        proc = Socket(sock, pid, timeout=self._proc.timeout, logfile=self._proc.logfile)
+        bond = Bond(proc, self.trans_except, lang=self.lang, proto=self._proto,
+                    framing=self._framing, shm=self._shm, features=self._features)
+        bond.channels = dict(self.channels)
+        bond.bindings = dict(self.bindings)
+        return bond
+
     def export(self, func, name=None):
         '''Export a local function "func" to be callable in the interpreter as "name".
         If "name" is not specified, use the local function name directly.'''
         if name is None:
             name = func.__name__
-        self._sendstate('EXPORT', self.dumps(name))
+        fut = self._request('EXPORT', self.dumps(name))
         self.bindings[name] = func
-        return self._repl()
+        self._relays.pop(name, None)
+        return self._wait(fut)
 
     def callable(self, name):
         '''Return a function calling "name"'''
         return lambda *args: self.call(name, *args)
 
-    def proxy(self, name, other, remote=None):
-        '''Export a function "name" to the "other" bond, named as "remote"'''
+    def proxy(self, name, other, remote=None, direct=False):
+        '''Export a function "name" to the "other" bond, named as "remote". If
+        "direct" is true and both interpreters support it (currently only
+        Python), calls are sent through a private socket between the two,
+        without passing through Python.'''
+        if direct and 'LINK' in self._features and 'LINK' in other._features:
+            try:
+                return self._link(name, other, remote or name)
+            except RemoteException:
+                pass
         other.export(self.callable(name), remote or name)
+        if self._proto is other._proto and hasattr(self._proto, 'split') and \
+           self.trans_except == other.trans_except:
+            # calls are relayed without decoding
+            other._relays[remote or name] = (self, name)
+
+    def _link(self, name, other, remote):
+        import shutil
+        import tempfile
+
+        # both sides must agree on the serialization protocol
+        proto = self._proto.__name__ if self._proto is other._proto else 'JSON'
+        path = tempfile.mkdtemp(prefix='bond-')
+        try:
+            path = os.path.join(path, 'link')
+            self._wait(self._request('LINK', self.dumps(['listen', path, proto])))
+            try:
+                connect = ['connect', path, name, remote, proto]
+                other._wait(other._request('LINK', other.dumps(connect)))
+            except Exception:
+                self._wait(self._request('LINK', self.dumps(['close', path])))
+                raise
+        finally:
+            shutil.rmtree(os.path.dirname(path))
 
     def interact(self, **kwargs):
         '''Start an interactive session with this bond. See ``bond.interact()``
@@ -215,41 +838,141 @@ class Bond(object):
         interact(self, **kwargs)
 
 
-# Drivers
-def query_driver(lang):
-    '''Query an individual driver by language name and return its raw data'''
-    path = os.path.join('drivers', lang, 'bond.json')
+class _LazyBond(Bond):
+    def __init__(self, lang, init):
+        # "init" runs in a background thread, returning the arguments of
+        # Bond(). Until it's done, only "lang" is set: any other attribute is
+        # looked up through __getattr__, waiting for the interpreter first.
+        from concurrent.futures import Future
+        self.lang = lang
+        self._init = Future()
+        self._init_lock = threading.Lock()
+        thread = threading.Thread(target=self._run, args=(init,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, init):
+        try:
+            self._init.set_result(init())
+        except Exception as e:
+            self._init.set_exception(e)
+
+    def __getattr__(self, name):
+        if '_init' not in self.__dict__:
+            raise AttributeError(name)
+        with self._init_lock:
+            if '_init' in self.__dict__:
+                # initialization errors are raised again on each use
+                proc, kwargs = self._init.result()
+                bond = Bond(proc, **kwargs)
+                # attributes assigned in the meantime (such as "channels" or
+                # "trans_except") take precedence over the defaults
+                for key, value in bond.__dict__.items():
+                    self.__dict__.setdefault(key, value)
+                del self._init
+                with _bonds_lock:
+                    _bonds.discard(bond)
+                    _bonds.add(self)
+        return getattr(self, name)
+
+
+def stats():
+    '''Return the performance counters of all the live bonds, as a list of
+    ``Bond.stats()`` snapshots'''
+    with _bonds_lock:
+        bonds = list(_bonds)
+    return [bond.stats() for bond in bonds]
+
+
+# Drivers are loaded once per process, and reloaded when any of their files
+# is modified
+_drivers_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'drivers')
+_drivers_cache = {}
+_drivers_lock = threading.Lock()
+
+def _driver_path(*path):
+    return os.path.join(_drivers_path, *path)
+
+
+def _cached(key, paths, load):
+    # return the result of "load()" stored under "key", as long as none of
+    # the files in "paths" changed since it was loaded
+    stamps = []
+    for path in paths:
+        st = os.stat(path)
+        stamps.append((st.st_mtime, st.st_size))
+    with _drivers_lock:
+        entry = _drivers_cache.get(key)
+    if entry is None or entry[0] != stamps:
+        entry = (stamps, load())
+        with _drivers_lock:
+            _drivers_cache[key] = entry
+    return entry[1]
+
+
+def _read_file(path):
+    with open(path, 'rb') as fd:
+        return fd.read().decode('utf-8')
+
+
+def _query_driver(lang):
+    path = _driver_path(lang, 'bond.json')
     try:
-        code = pkg_resources.resource_string(__name__, path).decode('utf-8')
-        data = json.loads(code)
-    except IOError as e:
+        return _cached(('data', path), [path], lambda: json.loads(_read_file(path)))
+    except (IOError, OSError) as e:
         raise BondException(lang, 'unable to load driver data: {error}'.format(error=str(e)))
     except ValueError as e:
         raise BondException(lang, 'malformed driver data: {error}'.format(error=str(e)))
-    return data
+
+
+def query_driver(lang):
+    '''Query an individual driver by language name and return its raw data'''
+    return json.loads(json.dumps(_query_driver(lang)))
 
 
 def list_drivers():
     '''Return a list of available language driver names'''
-    langs = []
-    drivers_path = pkg_resources.resource_filename(__name__, 'drivers')
-    for path in os.listdir(drivers_path):
-        data_path = os.path.join(drivers_path, path, 'bond.json')
-        if os.path.isfile(data_path):
-            langs.append(path)
-    return langs
+    def load():
+        langs = []
+        for path in os.listdir(_driver_path()):
+            if os.path.isfile(_driver_path(path, 'bond.json')):
+                langs.append(path)
+        return langs
+    return list(_cached(('langs', _driver_path()), [_driver_path()], load))
+
+
+def _remote_shell(cmd):
+    import pexpect
+    argv = pexpect.utils.split_command_line(cmd)
+    return len(argv) > 0 and os.path.basename(argv[0]) in REMOTE_SHELLS
 
 
 def _load_stage(lang, data):
-    stage = os.path.join('drivers', lang, data['file'])
-    stage = pkg_resources.resource_string(__name__, stage).decode('utf-8')
+    stage = _read_file(_driver_path(lang, data['file']))
     if 'sub' in data:
         sub = data['sub']
         stage = re.sub(sub[0], sub[1], stage)
     return stage.strip()
 
+
+def _load_stages(lang, data):
+    # return the first stage and the JSON-encoded code of the second stage,
+    # ready to be sent
+    init = data['init']
+    paths = [_driver_path(lang, 'bond.json'),
+             _driver_path(lang, init['stage1']['file']),
+             _driver_path(lang, init['stage2']['file'])]
+    def load():
+        return (_load_stage(lang, init['stage1']),
+                json.dumps(_load_stage(lang, init['stage2'])))
+    try:
+        return _cached(('stages', paths[0]), paths, load)
+    except (IOError, OSError) as e:
+        raise BondException(lang, 'unable to load driver stages: {error}'.format(error=str(e)))
+
 def make_bond(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True,
-              trans_except=None, timeout=60, protocol=None, logfile=None):
+              trans_except=None, timeout=60, protocol=None, logfile=None,
+              transport='pty', framing=None, shm=None, lazy=False):
     '''Construct a ``Bond`` using the specified language/command.
 
     "lang": a valid, supported language name (see ``list_drivers()``).
@@ -278,12 +1001,80 @@ def make_bond(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True
     automatically selected when not specified, and usually matches "JSON".
 
     "logfile": a file handle which is used to copy all input/output with the
-    interpreter for debugging purposes.'''
-
-    data = query_driver(lang)
+    interpreter for debugging purposes.
+
+    "transport": how the interpreter is connected. "pty" (the default) uses a
+    pseudo-terminal, while "pipe" uses plain pipes, which avoids the terminal
+    line discipline and has a lower per-message overhead.
+
+    "framing": forces a specific message framing to be chosen. "BINARY"
+    (length-prefixed messages) is automatically selected when supported by the
+    driver, falling back to the newline-delimited "LINE" framing.
+
+    "shm": enables a shared memory side channel for large payloads. When
+    enabled, payloads larger than a threshold (1 MiB by default, or the value
+    of "shm" if a positive integer) are passed through a memory-mapped file in
+    ``/dev/shm`` instead of the stream, and are decoded in place. It's enabled
+    by default only when using the driver's default (local) interpreter, and
+    always disabled with "ssh".
+
+    "lazy": return immediately, initializing the interpreter in a background
+    thread. The first use of the bond waits for the initialization to complete,
+    raising any initialization error instead.'''
+
+    if lazy:
+        init = lambda: _bootstrap(lang, cmd, args, cwd, env, def_args, trans_except, timeout,
+                                  protocol, logfile, transport, framing, shm)
+        return _LazyBond(lang, init)
+    proc, kwargs = _bootstrap(lang, cmd, args, cwd, env, def_args, trans_except, timeout,
+                              protocol, logfile, transport, framing, shm)
+    return Bond(proc, **kwargs)
+
+
+class _Send(object):
+    # a handshake step writing "line" to the terminal, which might not accept
+    # it all at once: "pos" tracks the progress
+    def __init__(self, line):
+        self.line = line
+        self.buf = None
+        self.pos = 0
+
+    def write(self, proc):
+        # write what the terminal accepts, returning true once done
+        if self.buf is None:
+            self.buf = proc.encode_line(self.line)
+        self.pos += proc.write_nonblocking(self.buf[self.pos:])
+        return self.pos >= len(self.buf)
+
+
+def _handshake(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True,
+                trans_except=None, timeout=60, protocol=None, logfile=None,
+                transport='pty', framing=None, shm=None):
+    # spawn and initialize the interpreter (see make_bond() for a description
+    # of the arguments). Each step yields a "(proc, pattern)" pair: the caller
+    # expects "pattern" on "proc" (or sends a ``_Send`` line), throwing back
+    # any pexpect exception, and resumes the handshake. It ends by yielding
+    # "(None, (proc, kwargs))", "kwargs" being the remaining Bond() arguments.
+    import pexpect
+    from bond.transports import TRANSPORTS
+    data = _query_driver(lang)
+    if transport not in TRANSPORTS:
+        raise BondException(lang, 'unknown transport "{transport}"'.format(transport=transport))
+    spawn = TRANSPORTS[transport]
+
+    # select the message framing
+    framing_list = list(filter(FRAMING.__contains__, data.get('framing', ['LINE'])))
+    if framing is not None:
+        if not isinstance(framing, list): framing = [framing]
+        framing_list = list(filter(framing_list.__contains__, framing))
+    if len(framing_list) < 1:
+        raise BondException(lang, 'no compatible message framing supported')
+    framing = framing_list[0]
 
     # select the highest compatible protocol
     protocol_list = list(filter(PROTO.__contains__, data['proto']))
+    if framing == 'LINE':
+        protocol_list = [x for x in protocol_list if x not in BINARY_PROTO]
     if protocol is not None:
         if not isinstance(protocol, list): protocol = [protocol]
         protocol_list = list(filter(protocol_list.__contains__, protocol))
@@ -291,11 +1082,35 @@ def make_bond(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True
         raise BondException(lang, 'no compatible protocol supported')
     protocol = protocol_list[0]
 
+    # shared memory side channel, only for local interpreters
+    remote = cmd is not None and _remote_shell(cmd)
+    if shm is None:
+        shm = cmd is None
+    if remote:
+        shm = False
+    if shm is True:
+        shm = framings.SHM_THRESHOLD
+    if shm and 'SHM' in data.get('features', []) \
+       and os.access(framings.SHM_DIR, os.W_OK):
+        shm = framings.SharedMemory(threshold=shm)
+    else:
+        shm = None
+
     # determine a good default for trans_except
     if trans_except is None:
-        trans_except = (lang == LANG and protocol == PROTO[0])
+        trans_except = (lang == LANG and protocol != 'JSON')
+
+    # load both stages before spawning the interpreter
+    stage1, stage2 = _load_stages(lang, data)
 
     # find a suitable command
+    startup = {}
+    laps = [time.time()]
+    def lap(phase):
+        # record the time spent in "phase" since the previous one ended
+        laps.append(time.time())
+        startup[phase] = laps[-1] - laps[-2]
+
     proc = None
     cmdline = None
     if args is None: args = []
@@ -303,7 +1118,7 @@ def make_bond(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True
         xargs = data['command'][0][1:] if def_args else []
         cmdline = ' '.join([cmd] + list(map(quote, xargs + args)))
         try:
-            proc = Spawn(cmdline, cwd=cwd, env=env, timeout=timeout, logfile=logfile)
+            proc = spawn(cmdline, cwd=cwd, env=env, timeout=timeout, logfile=logfile)
         except pexpect.ExceptionPexpect:
             raise BondException(lang, 'cannot execute: ' + cmdline)
     else:
@@ -311,50 +1126,189 @@ def make_bond(lang, cmd=None, args=None, cwd=None, env=os.environ, def_args=True
             xargs = cmd[1:] if def_args else []
             cmdline = ' '.join([cmd[0]] + list(map(quote, xargs + args)))
             try:
-                proc = Spawn(cmdline, cwd=cwd, env=env, timeout=timeout, logfile=logfile)
+                proc = spawn(cmdline, cwd=cwd, env=env, timeout=timeout, logfile=logfile)
                 break
             except pexpect.ExceptionPexpect:
                 pass
         if proc is None:
             raise BondException(lang, 'no suitable interpreter found')
+    lap('spawn')
+
+    # prepare the second stage in advance
+    start = [protocol, trans_except]
+    options = {}
+    if framing != 'LINE':
+        options['framing'] = framing
+        if protocol in BINARY_PROTO:
+            # let older remote interpreters fall back to another protocol
+            options['fallback'] = protocol_list[1:]
+    if shm is not None:
+        options['shm'] = {'path': shm.path, 'threshold': shm.threshold}
+    if options:
+        start.append(options)
+    stage2 = '{"code": ' + stage2 + ', "start": ' + json.dumps(start) + '}'
+
+    # drivers can allow stage2 to be sent along with stage1 on a terminal
+    pipeline = data['init'].get('pipeline', False) and hasattr(proc, 'sendline_timeout') \
+        and proc.isatty()
 
     try:
         # wait for a prompt if needed
         if 'wait' in data['init']:
-            proc.expect_noecho(data['init']['wait'])
-
-        # probe the interpreter
-        probe = data['init']['probe']
-        proc.sendline_noecho(probe)
-        if proc.expect_exact_noecho(['STAGE1\n', 'STAGE1\r\n']) == 1:
+            yield proc, data['init']['wait']
+
+        # probe the interpreter, injecting the base loader right away
+        proc.sendline(data['init']['probe'])
+        proc.sendline(stage1)
+        if pipeline:
+            yield proc, _Send(stage2)
+        yield proc, r'STAGE1(\r?)\n'
+        if proc.match.group(1) and proc.isatty():
             tty.setraw(proc.child_fd)
     except pexpect.ExceptionPexpect:
         raise BondException(lang, 'cannot get an interactive prompt using: ' + cmdline)
+    lap('probe')
 
-    # inject base loader
     try:
-        stage1 = _load_stage(lang, data['init']['stage1'])
-        proc.sendline_noecho(stage1)
-        if proc.expect_exact_noecho(['STAGE2\n', 'STAGE2\r\n']) == 1:
-            raise BondException(lang, 'cannot switch terminal to raw mode')
+        yield proc, r'STAGE2(\r?)\n'
+        if proc.match.group(1):
+            # the interpreter can restore the terminal settings it saved
+            # before we switched to raw mode after the probe
+            if pipeline or not proc.isatty():
+                raise BondException(lang, 'cannot switch terminal to raw mode')
+            tty.setraw(proc.child_fd)
     except pexpect.ExceptionPexpect:
         errors = proc.before.decode('utf-8')
         raise BondException(lang, 'cannot initialize stage1: ' + errors)
+    lap('stage1')
 
     # load the second stage
     try:
-        stage2 = _load_stage(lang, data['init']['stage2'])
-        stage2 = protocols.JSON.dumps({'code': stage2, 'start': [protocol, trans_except]})
-        proc.sendline(stage2)
-        proc.expect_exact("READY\n")
+        if not pipeline:
+            proc.sendline(stage2)
+        yield proc, r'READY(?: ([^\n]*))?\n'
+        ready = proc.match.group(1)
     except pexpect.ExceptionPexpect:
         errors = proc.before.decode('utf-8')
         raise BondException(lang, 'cannot initialize stage2: ' + errors)
+    lap('stage2')
+
+    # the driver can override some of the requested settings, and disable
+    # features which are not available in this interpreter
+    features = data.get('features', [])
+    if ready:
+        ready = protocols.JSON.loads(ready)
+        protocol = ready.get('proto', protocol)
+        if protocol not in protocol_list:
+            raise BondException(lang, 'unsupported protocol "{proto}" selected by the '
+                                'driver'.format(proto=protocol))
+        features = [x for x in features if x not in ready.get('disabled', [])]
 
     # remote environment is ready
-    proc.delaybeforesend = 0
     proto = getattr(protocols, protocol)
-    return Bond(proc, trans_except, lang=lang, proto=proto)
+    if remote:
+        features = [x for x in features if x not in ('FORK', 'INTERRUPT', 'LINK', 'REDIRECT')]
+    yield None, (proc, {'trans_except': trans_except, 'lang': lang, 'proto': proto,
+                        'framing': getattr(framings, framing), 'shm': shm,
+                        'features': features, 'startup': startup})
+
+
+def _bootstrap(*args, **kwargs):
+    # spawn and initialize the interpreter, returning the process and the
+    # remaining Bond() arguments
+    import pexpect
+    handshake = _handshake(*args, **kwargs)
+    proc, pattern = next(handshake)
+    while proc is not None:
+        try:
+            if isinstance(pattern, _Send):
+                proc.sendline_timeout(pattern.line, proc.timeout)
+            else:
+                proc.expect(pattern)
+        except pexpect.ExceptionPexpect as e:
+            proc, pattern = handshake.throw(e)
+        else:
+            proc, pattern = next(handshake)
+    return pattern
+
+
+def make_bonds(lang, n, cmd=None, partial=False, **kwargs):
+    '''Construct "n" bonds at once, using the same arguments as
+    ``make_bond()``. "cmd" can also be a list of "n" commands, one for each
+    bond. All the interpreters are started right away, and their
+    initialization is then performed concurrently.
+
+    Return the list of ``Bond`` objects. If any of them fails to initialize,
+    the others are closed and the first error is raised. If "partial" is
+    true, the list contains the ``BondException`` raised in place of each
+    failed bond instead.'''
+    import pexpect
+    cmds = cmd if isinstance(cmd, list) else [cmd] * n
+    if len(cmds) != n:
+        raise ValueError('expected {n} commands'.format(n=n))
+    handshakes = [_handshake(lang, cmd, **kwargs) for cmd in cmds]
+    bonds = [None] * n
+    procs = [None] * n
+    waiting = {}
+
+    def resume(i, step=None, deadline=None):
+        # advance the handshake until it needs to wait for more data
+        handshake = handshakes[i]
+        try:
+            if step is None:
+                step = next(handshake)
+            while step[0] is not None:
+                proc, pattern = step
+                procs[i] = proc
+                try:
+                    if isinstance(pattern, _Send):
+                        # wait for the terminal to be writable again
+                        if not pattern.write(proc):
+                            raise pexpect.TIMEOUT('Timeout exceeded.')
+                    else:
+                        proc.expect(pattern, timeout=0)
+                except pexpect.TIMEOUT as e:
+                    if deadline is None:
+                        deadline = float('inf') if proc.timeout is None \
+                                   else time.time() + proc.timeout
+                    if time.time() < deadline:
+                        waiting[proc.child_fd] = (i, step, deadline)
+                        return
+                    step = handshake.throw(e)
+                except pexpect.ExceptionPexpect as e:
+                    step = handshake.throw(e)
+                else:
+                    step = next(handshake)
+                deadline = None
+            bonds[i] = Bond(step[1][0], **step[1][1])
+        except BondException as e:
+            bonds[i] = e
+            if procs[i] is not None:
+                procs[i].terminate(force=True)
+                procs[i].close()
+
+    for i in range(n):
+        resume(i)
+    while waiting:
+        timeout = max(0, min(entry[2] for entry in waiting.values()) - time.time())
+        if timeout == float('inf'): timeout = None
+        writers = [fd for fd, entry in waiting.items() if isinstance(entry[1][1], _Send)]
+        readers = [fd for fd in waiting if fd not in writers]
+        ready = pexpect.utils.select_ignore_interrupts(readers, writers, [], timeout)
+        ready = ready[0] + ready[1]
+        now = time.time()
+        for fd, (i, step, deadline) in list(waiting.items()):
+            if fd in ready or now >= deadline:
+                del waiting[fd]
+                resume(i, step, deadline)
+
+    errors = [bond for bond in bonds if isinstance(bond, BondException)]
+    if errors and not partial:
+        for bond in bonds:
+            if not isinstance(bond, BondException):
+                bond.close()
+        raise errors[0]
+    return bonds
 
 
 
@@ -410,3 +1364,23 @@ def interact(bond, prompt=None):
         # answer
         if ret is not None:
             print(ret)
+
+
+# Transports, pools and the metrics exporter are only imported on first use,
+# as pexpect, concurrent.futures and http.server are slow to load
+_LAZY = {'Spawn': 'bond.transports', 'Pipe': 'bond.transports',
+         'Socket': 'bond.transports', 'TRANSPORTS': 'bond.transports',
+         'BondPool': 'bond.pool', 'BondExecutor': 'bond.pool',
+         'ForkServer': 'bond.pool', 'serve_metrics': 'bond.metrics'}
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module '{module}' has no attribute '{name}'".format(
+            module=__name__, name=name))
+    return getattr(importlib.import_module(_LAZY[name]), name)
+
+if sys.version_info < (3, 7):
+    # no module-level __getattr__
+    from bond.transports import Spawn, Pipe, Socket, TRANSPORTS
+    from bond.pool import BondPool, BondExecutor, ForkServer
+    from bond.metrics import serve_metrics
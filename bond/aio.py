@@ -0,0 +1,313 @@
+# asyncio support (Python 3.7+)
+import asyncio
+import collections
+import contextvars
+import functools
+import inspect
+import os
+
+from bond import Bond, BondException, RemoteHandle, _Send, _handshake, _timer, framings
+
+
+# bond currently running an exported function in this context: requests
+# issued from there are nested inside the pending one and must not wait for it
+_callback_bond = contextvars.ContextVar('bond_callback', default=None)
+
+
+class _Output(object):
+    # collects the chunks written by a framing, so that they can be sent
+    # whenever the interpreter accepts them
+    def __init__(self, proc):
+        self.proc = proc
+        self.chunks = collections.deque()
+
+    def sendv(self, chunks):
+        for chunk in chunks:
+            if len(chunk):
+                self.proc._log(chunk, 'send')
+                self.chunks.append(memoryview(chunk).cast('B'))
+
+    def send(self, s):
+        self.sendv([s])
+
+    def sendline(self, s=b''):
+        self.sendv([s, self.proc.linesep])
+
+
+class AsyncBond(Bond):
+    _reader_type = framings.FeedReader
+
+    def __init__(self, proc, trans_except, loop=None, **kwargs):
+        '''Construct an asynchronous bond using an pre-initialized interpreter.
+        Use ``bond.aio.make_bond_async()`` to initialize it using a language driver.
+
+        Messages are read by "loop" (the current event loop by default) as soon
+        as they arrive. ``eval()``, ``eval_block()``, ``call()`` and
+        ``export()`` are coroutines, while exported functions can be either
+        plain functions or coroutines. See ``Bond()`` for other arguments.'''
+        super(AsyncBond, self).__init__(proc, trans_except, **kwargs)
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._order = asyncio.Lock()
+        self._pending = []
+        self._error = None
+        self._output = _Output(proc)
+        self._writing = False
+        self._loop.add_reader(proc.child_fd, self._readable)
+        if self._reader.buf:
+            self._loop.call_soon(self._process)
+
+
+    def _readable(self):
+        try:
+            self._reader.fill()
+        except Exception as e:
+            self._abort(e)
+            return
+        self._process()
+
+    def _process(self):
+        while self._error is None:
+            try:
+                cmd, code = self._recvstate()
+                self._dispatch(cmd, code)
+            except framings.Incomplete:
+                break
+            except Exception as e:
+                self._abort(e)
+
+    def _sendstate(self, cmd, code):
+        # messages are queued and written as the interpreter accepts them,
+        # without ever blocking the loop
+        self._framing.send(self._output, *self._outstate(cmd, code))
+        self._flush()
+
+    def _flush(self):
+        chunks = self._output.chunks
+        try:
+            while chunks:
+                size = self._proc.write_nonblocking(chunks[0])
+                if size < len(chunks[0]):
+                    chunks[0] = chunks[0][size:]
+                    break
+                chunks.popleft()
+        except Exception as e:
+            self._abort(e)
+            return
+        if chunks and not self._writing:
+            self._loop.add_writer(self._write_fd(), self._flush)
+            self._writing = True
+        elif not chunks and self._writing:
+            self._loop.remove_writer(self._write_fd())
+            self._writing = False
+
+    def _write_fd(self):
+        return getattr(self._proc, 'write_fd', self._proc.child_fd)
+
+    def _dispatch(self, cmd, code):
+        if cmd == "CALL":
+            self._loop.create_task(self._callback(code))
+            return
+        elif cmd == "OUTPUT":
+            args = self.loads(code)
+            self.channels[args[0]].write(args[1])
+            return
+        if not self._pending:
+            raise BondException(self.lang, 'unexpected interpreter state')
+
+        # any other state terminates the innermost pending request
+        fut = self._pending.pop()
+        try:
+            args = self.loads(code) if code is not None else []
+            if cmd != "RETURN":
+                raise self._exception(cmd, args)
+        except Exception as e:
+            if not fut.done(): fut.set_exception(e)
+        else:
+            if not fut.done(): fut.set_result(args)
+
+    def _abort(self, error):
+        # the bond is unusable past this point: fail all pending requests
+        self._error = error
+        self._loop.remove_reader(self._proc.child_fd)
+        if self._writing:
+            self._loop.remove_writer(self._write_fd())
+            self._writing = False
+        self._output.chunks.clear()
+        while self._pending:
+            fut = self._pending.pop()
+            if not fut.done(): fut.set_exception(error)
+
+    async def _callback(self, code):
+        _callback_bond.set(self)
+        ret = None
+        state = "RETURN"
+        try:
+            args = self.loads(code)
+            start = _timer()
+            try:
+                ret = self.bindings[args[0]](*args[1])
+                if inspect.isawaitable(ret):
+                    ret = await ret
+            finally:
+                self._stats.callback(args[0], _timer() - start)
+        except Exception as e:
+            state = "EXCEPT"
+            ret = e if self.trans_except else str(e)
+        self._sendstate(*self._reply_state(state, ret))
+
+    async def _request(self, cmd, code):
+        nested = _callback_bond.get() is self
+        if not nested:
+            await self._order.acquire()
+        fut = self._loop.create_future()
+        if not nested:
+            # keep the bond locked until the reply arrives, even if the
+            # caller is cancelled, so that replies stay in order
+            fut.add_done_callback(lambda fut: self._order.release())
+        if self._error is not None:
+            fut.set_exception(self._error)
+        else:
+            self._pending.append(fut)
+            released = {}
+            while self._released:
+                op, id = self._released.popleft()
+                released.setdefault(op, []).append(id)
+            for op in released:
+                # the reply comes first and is simply discarded
+                discard = self._loop.create_future()
+                discard.add_done_callback(lambda fut: fut.exception())
+                self._pending.append(discard)
+            try:
+                for op, ids in released.items():
+                    self._sendstate('HANDLE', self.dumps([op, ids]))
+                self._sendstate(cmd, code)
+            except Exception as e:
+                self._abort(e)
+        return await asyncio.shield(fut)
+
+
+    async def eval(self, code):
+        '''Evaluate and return the value of a single statement of code in the interpreter.'''
+        return await self._request('EVAL', self.dumps(self._data(code)))
+
+    async def eval_block(self, code):
+        '''Evaluate a "code" block inside the interpreter. Nothing is returned.'''
+        return await self._request('EVAL_BLOCK', self.dumps(self._data(code)))
+
+    async def call(self, name, *args, by_ref=False):
+        '''Call a function "name" using *args (apply *args to a callable statement "name").
+        If "by_ref" is true, return a ``RemoteHandle`` to the result instead
+        (see ``Bond.call()``): accessing a value kept by the interpreter
+        returns a coroutine.'''
+        if by_ref:
+            if 'HANDLE' not in self._features:
+                return RemoteHandle(self, None, await self.call(name, *args))
+            xargs = [self._xarg(arg) for arg in args]
+            id = await self._request('HANDLE', self.dumps(['call', name, xargs]))
+            return self._new_handle(id)
+        try:
+            return await self._request(*self._call_state(name, args))
+        finally:
+            if 'REF' in self._features:
+                self._registered(args)
+
+    async def export(self, func, name=None):
+        '''Export a local function or coroutine "func" to be callable in the
+        interpreter as "name". If "name" is not specified, use the local
+        function name directly.'''
+        if name is None:
+            name = func.__name__
+        self.bindings[name] = func
+        return await self._request('EXPORT', self.dumps(name))
+
+    async def _handle(self, *args):
+        return await self._request('HANDLE', self.dumps(list(args)))
+
+    def call_async(self, name, *args):
+        '''Schedule a call to "name" using *args, returning an asyncio future'''
+        return asyncio.ensure_future(self.call(name, *args), loop=self._loop)
+
+    def callable(self, name):
+        '''Return a coroutine function calling "name"'''
+        return functools.partial(self.call, name)
+
+    async def proxy(self, name, other, remote=None):
+        '''Export a function "name" to the "other" ``AsyncBond``, named as "remote"'''
+        return await other.export(self.callable(name), remote or name)
+
+    async def redirect(self, chan, path=None):
+        '''Write the output of "chan" to the file "path", or back to
+        ``channels`` if None (see ``Bond.redirect()``)'''
+        if 'REDIRECT' in self._features:
+            if path is not None:
+                path = os.path.abspath(path)
+            await self._request('REDIRECT', self.dumps([chan, path]))
+        else:
+            self._redirect(chan, path)
+
+    def close(self):
+        '''Terminate the underlying interpreter'''
+        if self._error is None:
+            self._abort(BondException(self.lang, 'bond closed'))
+        super(AsyncBond, self).close()
+
+    def interact(self, **kwargs):
+        raise BondException(self.lang, 'interact() is not supported by AsyncBond')
+
+
+async def _ready(loop, fd, writer, timeout):
+    # wait for "fd" to be readable (or writable) for at most "timeout" seconds
+    fut = loop.create_future()
+    add, remove = (loop.add_writer, loop.remove_writer) if writer else \
+                  (loop.add_reader, loop.remove_reader)
+    add(fd, lambda: fut.done() or fut.set_result(None))
+    try:
+        await asyncio.wait_for(fut, timeout)
+    finally:
+        remove(fd)
+
+
+async def make_bond_async(lang, *args, **kwargs):
+    '''Construct an ``AsyncBond`` using the specified language/command. The
+    arguments are the same as ``bond.make_bond()``. The interpreter is
+    initialized by the running loop, which keeps serving other tasks while
+    waiting for it.'''
+    import pexpect
+    loop = asyncio.get_running_loop()
+    handshake = _handshake(lang, *args, **kwargs)
+    step = next(handshake)
+    while step[0] is not None:
+        proc, pattern = step
+        deadline = None
+        if proc.timeout is not None:
+            deadline = loop.time() + proc.timeout
+        try:
+            while True:
+                try:
+                    if isinstance(pattern, _Send):
+                        if not pattern.write(proc):
+                            raise pexpect.TIMEOUT('Timeout exceeded.')
+                    else:
+                        proc.expect(pattern, timeout=0)
+                    break
+                except pexpect.TIMEOUT:
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0: raise
+                    writer = isinstance(pattern, _Send)
+                    try:
+                        await _ready(loop, proc.child_fd, writer, timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        except pexpect.ExceptionPexpect as e:
+            step = handshake.throw(e)
+        except BaseException:
+            # cancelled while waiting
+            proc.terminate(force=True)
+            proc.close()
+            raise
+        else:
+            step = next(handshake)
+    proc, kwargs = step[1]
+    return AsyncBond(proc, loop=loop, **kwargs)
@@ -0,0 +1,324 @@
+// bond Javascript interface setup
+var util = require("util");
+
+// Channels and buffers
+var __BOND_BUFFERS = {
+  "STDOUT": "",
+  "STDERR": ""
+};
+
+var __BOND_REDIRECTS = {};
+
+function __BOND_redirect(chan, path)
+{
+  if(!__BOND_BUFFERS.hasOwnProperty(chan))
+    throw new Error("unknown channel \"" + chan + "\"");
+  var fd = (path == null? null: fs.openSync(path, "a"));
+  if(__BOND_REDIRECTS[chan] != null)
+    fs.closeSync(__BOND_REDIRECTS[chan]);
+  delete __BOND_REDIRECTS[chan];
+  if(fd != null)
+    __BOND_REDIRECTS[chan] = fd;
+}
+
+function __BOND_write(chan, buf)
+{
+  // redirected output is written synchronously, without buffering
+  var fd = __BOND_REDIRECTS[chan];
+  if(fd != null)
+    fs.writeSync(fd, String(buf));
+  else
+    __BOND_BUFFERS[chan] += buf;
+}
+
+var __BOND_CHANNELS = {
+  "STDIN": __BOND_STDIN,
+  "STDOUT": fs.openSync("/dev/stdout", "w"),
+  "STDERR": fs.openSync("/dev/stderr", "w")
+};
+
+
+// Define our own i/o methods
+function __BOND_sendline(line)
+{
+  if(line == null) line = "";
+  var buf = new Buffer(line + "\n");
+  fs.writeSync(__BOND_CHANNELS["STDOUT"], buf, 0, buf.length);
+}
+
+
+// Our minimal exception signature
+function _BOND_SerializationException(message)
+{
+  this.message = message;
+}
+
+util.inherits(_BOND_SerializationException, TypeError);
+_BOND_SerializationException.prototype.name = "_BOND_SerializationException";
+
+
+// Serialization methods
+function __BOND_typecheck(key, value)
+{
+  if(typeof value === 'function' && value.toJSON == null)
+    throw new TypeError("cannot serialize " + Object.getPrototypeOf(value));
+  return value;
+}
+
+function __BOND_dumps(data)
+{
+  var ret;
+  try { ret = JSON.stringify(data, __BOND_typecheck); }
+  catch(e) { throw new _BOND_SerializationException(e.toString()); }
+  return ret;
+}
+
+function __BOND_loads(string)
+{
+  return JSON.parse(string);
+}
+
+
+// Recursive repl
+var __BOND_TRANS_EXCEPT;
+
+function __BOND_remote(name, args)
+{
+  var code = __BOND_dumps([name, args]);
+  __BOND_sendline("CALL " + code);
+  return __BOND_repl();
+}
+
+function __BOND_export(name)
+{
+  global[name] = function()
+  {
+    return __BOND_remote(name, Array.prototype.slice.call(arguments));
+  };
+}
+
+// Values kept by reference
+var __BOND_HANDLES = {};
+var __BOND_HANDLES_ID = 0;
+var __BOND_REFS = {};
+
+function __BOND_handle_value(id)
+{
+  if(!__BOND_HANDLES.hasOwnProperty(id))
+    throw new Error("unknown handle " + id);
+  return __BOND_HANDLES[id];
+}
+
+function __BOND_ref(el)
+{
+  // references are compiled once as a function
+  if(el.length > 2)
+  {
+    try { __BOND_REFS[el[1]] = eval.call(null, "(function() { return (" + el[2] + "); })"); }
+    catch(e) { __BOND_REFS[el[1]] = function() { throw e; }; }
+  }
+  if(!__BOND_REFS.hasOwnProperty(el[1]))
+    throw new Error("unknown reference " + el[1]);
+  return __BOND_REFS[el[1]]();
+}
+
+function __BOND_xcall(name, xargs)
+{
+  var func = eval.call(null, "(" + name + ")");
+  var args = [];
+  for(var i = 0; i != xargs.length; ++i)
+  {
+    var el = xargs[i];
+    if(el[0] == 2)
+      args.push(__BOND_handle_value(el[1]));
+    else if(el[0] == 3)
+      args.push(__BOND_ref(el));
+    else
+      args.push(!el[0]? el[1]: eval.call(null, "(" + el[1] + ")"));
+  }
+  return func.apply(null, args);
+}
+
+function __BOND_handle(op, args)
+{
+  switch(op)
+  {
+  case "call":
+    var ret = __BOND_xcall(args[0], args[1]);
+    __BOND_HANDLES[++__BOND_HANDLES_ID] = ret;
+    return __BOND_HANDLES_ID;
+
+  case "fetch":
+    return __BOND_handle_value(args[0]);
+
+  case "getitem":
+    return __BOND_handle_value(args[0])[args[1]];
+
+  case "release":
+    for(var i = 0; i != args[0].length; ++i)
+      delete __BOND_HANDLES[args[0][i]];
+    return null;
+
+  case "unref":
+    for(var i = 0; i != args[0].length; ++i)
+      delete __BOND_REFS[args[0][i]];
+    return null;
+  }
+  throw new Error("unknown handle operation " + op);
+}
+
+function __BOND_repl()
+{
+  var SENTINEL = 1;
+  var line;
+  while((line = __BOND_getline()))
+  {
+    var spc = line.indexOf(" ");
+    var cmd = line.substring(0, spc < 0? undefined: spc);
+    var args = (spc > 0? __BOND_loads(line.substring(spc + 1)): []);
+
+    var ret = null;
+    var err = null;
+    switch(cmd)
+    {
+    case "EVAL":
+      try { ret = eval.call(null, "(" + args + ")"); }
+      catch(e) { err = e; }
+      break;
+
+    case "EVAL_BLOCK":
+      try { eval.call(null, args); }
+      catch(e) { err = e; }
+      break;
+
+    case "EXPORT":
+      __BOND_export(args);
+      break;
+
+    case "CALL":
+      try
+      {
+	// NOTE: we add an extra set of parenthesis to allow anonymous
+	//       functions to be parsed without an assignment
+	var func = eval.call(null, "(" + args[0] + ")");
+	ret = func.apply(null, args[1]);
+      }
+      catch(e)
+      {
+	err = e;
+      }
+      break;
+
+    case "XCALL":
+      try { ret = __BOND_xcall(args[0], args[1]); }
+      catch(e) { err = e; }
+      break;
+
+    case "HANDLE":
+      try { ret = __BOND_handle(args[0], args.slice(1)); }
+      catch(e) { err = e; }
+      break;
+
+    case "BATCH":
+      // failing calls are returned in place of their result
+      try
+      {
+	var func = eval.call(null, "(" + args[0] + ")");
+	ret = [];
+	for(var i = 0; i != args[1].length; ++i)
+	{
+	  try { ret.push(["RETURN", func.apply(null, args[1][i])]); }
+	  catch(e) { ret.push(["EXCEPT", (__BOND_TRANS_EXCEPT? e: e.toString())]); }
+	}
+      }
+      catch(e)
+      {
+	err = e;
+      }
+      break;
+
+    case "REDIRECT":
+      try { __BOND_redirect(args[0], args[1]); }
+      catch(e) { err = e; }
+      break;
+
+    case "RETURN":
+      return args;
+
+    case "EXCEPT":
+      throw new Error(args);
+
+    case "ERROR":
+      throw new _BOND_SerializationException(args);
+
+    default:
+      process.exit(1);
+    }
+
+    // redirected channels
+    for(var chan in __BOND_BUFFERS)
+    {
+      var buf = __BOND_BUFFERS[chan];
+      if(buf.length)
+      {
+	var code = __BOND_dumps([chan, buf]);
+	__BOND_sendline("OUTPUT " + code);
+	__BOND_BUFFERS[chan] = "";
+      }
+    }
+
+    // error state
+    var state = "RETURN";
+    if(err != null)
+    {
+      if(err instanceof _BOND_SerializationException)
+      {
+	state = "ERROR";
+	ret = err.message;
+      }
+      else
+      {
+	state = "EXCEPT";
+	ret = (__BOND_TRANS_EXCEPT? err: err.toString());
+      }
+    }
+    var code;
+    try
+    {
+      if(ret == null) ret = null;
+      code = __BOND_dumps(ret);
+    }
+    catch(e)
+    {
+      state = "ERROR";
+      code = __BOND_dumps(e.message);
+      if(cmd == "BATCH" && err == null)
+      {
+	// values that cannot be encoded only fail their own call
+	for(var i = 0; i != ret.length; ++i)
+	{
+	  try { __BOND_dumps(ret[i]); }
+	  catch(e) { ret[i] = ["ERROR", e.message]; }
+	}
+	state = "RETURN";
+	code = __BOND_dumps(ret);
+      }
+    }
+    __BOND_sendline(state + " " + code);
+  }
+  return 0;
+}
+
+function __BOND_start(proto, trans_except)
+{
+  // TODO: this is a hack
+  process.stdout.write = function(buf) { __BOND_write("STDOUT", buf); };
+  process.stderr.write = function(buf) { __BOND_write("STDERR", buf); };
+  process.stdin.read = function() { return undefined; };
+
+  __BOND_TRANS_EXCEPT = trans_except;
+  __BOND_sendline("ready".toUpperCase());
+  var ret = __BOND_repl();
+  __BOND_sendline("BYE");
+  process.exit(ret);
+}
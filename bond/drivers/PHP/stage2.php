@@ -0,0 +1,607 @@
+//<?php
+// bond PHP interface setup
+
+// Redirect normal output
+$__BOND_BUFFERS = array(
+    "STDOUT" => "",
+    "STDERR" => ""
+);
+
+$__BOND_REDIRECTS = array();
+
+function __BOND_redirect($chan, $path)
+{
+  global $__BOND_BUFFERS, $__BOND_REDIRECTS;
+  if(!isset($__BOND_BUFFERS[$chan]))
+    throw new Exception("unknown channel \"$chan\"");
+  $stream = null;
+  if(isset($path))
+  {
+    $stream = @fopen($path, "a");
+    if(!$stream)
+      throw new Exception("cannot open $path");
+  }
+  if(isset($__BOND_REDIRECTS[$chan]))
+    fclose($__BOND_REDIRECTS[$chan]);
+  unset($__BOND_REDIRECTS[$chan]);
+  if($stream)
+    $__BOND_REDIRECTS[$chan] = $stream;
+}
+
+class __BOND_BUFFERED
+{
+  public $name;
+
+  public function stream_open($path, $mode, $options, &$opened_path)
+  {
+    global $__BOND_BUFFERS;
+    $path = strtoupper(substr(strstr($path, "://"), 3));
+    if(!isset($__BOND_BUFFERS[$path]))
+      return false;
+    $this->name = $path;
+    return true;
+  }
+
+  public function stream_write($data)
+  {
+    global $__BOND_BUFFERS, $__BOND_REDIRECTS;
+    if(isset($__BOND_REDIRECTS[$this->name]))
+      return fwrite($__BOND_REDIRECTS[$this->name], $data);
+    $buffer = &$__BOND_BUFFERS[$this->name];
+    $buffer .= $data;
+    return strlen($data);
+  }
+}
+
+
+// Redefine standard streams
+$__BOND_CHANNELS = array(
+    "STDIN" => $__BOND_STDIN,
+    "STDOUT" => fopen("php://stdout", "w"),
+    "STDERR" => fopen("php://stderr", "w")
+);
+
+stream_wrapper_unregister("php");
+stream_wrapper_register("php", "__BOND_BUFFERED");
+
+if(!defined("STDIN"))
+  define('STDIN', null);
+if(!defined("STDOUT"))
+  define('STDOUT', fopen("php://stdout", "w"));
+if(!defined("STDERR"))
+  define('STDERR', fopen("php://stderr", "w"));
+
+
+// Define our own i/o methods
+function __BOND_output($buffer, $phase)
+{
+  fwrite(STDOUT, $buffer);
+}
+
+function __BOND_getline()
+{
+  global $__BOND_CHANNELS;
+  return rtrim(fgets($__BOND_CHANNELS['STDIN']));
+}
+
+function __BOND_sendline($line = '')
+{
+  global $__BOND_CHANNELS;
+  $stdout = $__BOND_CHANNELS['STDOUT'];
+  fwrite($stdout, $line . "\n");
+  fflush($stdout);
+}
+
+
+// some utilities to get/reset the error state
+$__BOND_ERROR_LEVEL = null;
+
+function _BOND_error_reporting($level = false)
+{
+  // without the ability to trap E_PARSE messages without @ (that is, our
+  // handler is not even called!), and without the ability to redefine/wrap the
+  // standard error_reporting() function, we have no choice but let the users
+  // call our own wrapper directly to control the displayed error level
+  global $__BOND_ERROR_LEVEL;
+  if($level !== false) $__BOND_ERROR_LEVEL = $level;
+  return $__BOND_ERROR_LEVEL;
+}
+
+function __BOND_error_type($type)
+{
+  switch($type)
+  {
+  case E_ERROR: return 'E_ERROR';
+  case E_WARNING: return 'E_WARNING';
+  case E_PARSE: return 'E_PARSE';
+  case E_NOTICE: return 'E_NOTICE';
+  case E_CORE_ERROR: return 'E_CORE_ERROR';
+  case E_CORE_WARNING: return 'E_CORE_WARNING';
+  case E_CORE_ERROR: return 'E_COMPILE_ERROR';
+  case E_CORE_WARNING: return 'E_COMPILE_WARNING';
+  case E_USER_ERROR: return 'E_USER_ERROR';
+  case E_USER_WARNING: return 'E_USER_WARNING';
+  case E_USER_NOTICE: return 'E_USER_NOTICE';
+  case E_STRICT: return 'E_STRICT';
+  case E_RECOVERABLE_ERROR: return 'E_RECOVERABLE_ERROR';
+  case E_DEPRECATED: return 'E_DEPRECATED';
+  case E_USER_DEPRECATED: return 'E_USER_DEPRECATED';
+  }
+  return $type;
+}
+
+function __BOND_error_handler($errno, $errstr)
+{
+  global $__BOND_ERROR_LEVEL;
+  if(!empty($errstr) && ini_get('display_errors') && ($errno & $__BOND_ERROR_LEVEL))
+  {
+    $type = __BOND_error_type($errno);
+    fwrite(STDERR, "PHP[$type]: $errstr\n");
+  }
+  return false;
+}
+
+function __BOND_clear_error()
+{
+  // cheap way to reset the last error state
+  @trigger_error(null);
+}
+
+function __BOND_get_error($mask = null)
+{
+  $err = error_get_last();
+  if(!isset($mask))
+    $mask = (E_ERROR | E_PARSE | E_CORE_ERROR | E_COMPILE_ERROR | E_RECOVERABLE_ERROR);
+  return (!empty($err['message']) && ($err['type'] & $mask)? $err: false);
+}
+
+
+// Serialization methods
+class _BOND_SerializationException extends Exception {}
+
+function __BOND_dumps($data)
+{
+  __BOND_clear_error();
+  $code = @json_encode($data);
+  if(__BOND_get_error(E_ALL) || json_last_error())
+    throw new _BOND_SerializationException(@"cannot encode $data");
+  return $code;
+}
+
+function __BOND_loads($string)
+{
+  return json_decode($string);
+}
+
+
+// Interrupts: SIGINT only throws while evaluating a request
+$__BOND_INTERRUPTIBLE = false;
+
+function __BOND_sigint($signo)
+{
+  global $__BOND_INTERRUPTIBLE;
+  if($__BOND_INTERRUPTIBLE)
+    throw new Exception("interrupted");
+}
+
+
+// Recursive repl
+$__BOND_TRANS_EXCEPT = null;
+
+function __BOND_remote($name, $args)
+{
+  global $__BOND_INTERRUPTIBLE;
+  $interruptible = $__BOND_INTERRUPTIBLE;
+  $__BOND_INTERRUPTIBLE = false;
+  try
+  {
+    $code = __BOND_dumps(array($name, $args));
+    __BOND_sendline("CALL $code");
+    $ret = __BOND_repl();
+  }
+  catch(Exception $e)
+  {
+    $__BOND_INTERRUPTIBLE = $interruptible;
+    throw $e;
+  }
+  $__BOND_INTERRUPTIBLE = $interruptible;
+  return $ret;
+}
+
+function __BOND_eval($code)
+{
+  // encase "code" in an anonymous block, hiding our local variables and
+  // simulating the global scope
+  $SENTINEL = 1;
+  __BOND_clear_error();
+  $ret = @eval("return call_user_func(function()
+  {
+    extract(\$GLOBALS, EXTR_REFS);
+    return ($code);
+  }, null);");
+  $err = __BOND_get_error();
+  if($err) throw new Exception($err['message']);
+  return $ret;
+}
+
+function __BOND_exec($code)
+{
+  // like "eval", but exports any local definition to the global scope
+  $SENTINEL = 1;
+  __BOND_clear_error();
+  @eval("call_user_func(function()
+  {
+    extract(\$GLOBALS, EXTR_REFS);
+    { $code; }
+    \$__BOND_VARS = get_defined_vars();
+    foreach(\$__BOND_VARS as \$k => &\$v)
+      if(!isset(\$GLOBALS[\$k]))
+	\$GLOBALS[\$k] = \$v;
+    foreach(array_keys(\$GLOBALS) as \$k)
+      if(!isset(\$__BOND_VARS[\$k]))
+	unset(\$GLOBALS[\$k]);
+  }, null);");
+  $err = __BOND_get_error();
+  if($err) throw new Exception($err['message']);
+}
+
+function __BOND_call($name, $args)
+{
+  $ret = null;
+  if(is_callable($name))
+  {
+    // special-case regular functions for performance
+    __BOND_clear_error();
+    $ret = @call_user_func_array($name, $args);
+    $err = __BOND_get_error();
+    if($err) throw new Exception($err['message']);
+  }
+  elseif(preg_match("/^[a-zA-Z_\x7f-\xff][a-zA-Z0-9_\x7f-\xff]*$/", $name))
+  {
+    // avoid fatal errors, but still emit proper exceptions as opposed to "warnings"
+    throw new Exception("undefined function \"$name\"");
+  }
+  else
+  {
+    // construct a string that we can interpret "function-like", to
+    // handle also function references and method calls uniformly
+    $args_ = array();
+    foreach($args as &$el)
+      $args_[] = var_export($el, true);
+    $args_ = implode(", ", $args_);
+    $ret = __BOND_eval("$name($args_)");
+  }
+  return $ret;
+}
+
+// Values kept by reference
+$__BOND_HANDLES = array();
+$__BOND_HANDLES_ID = 0;
+$__BOND_REFS = array();
+
+function __BOND_handle_value($id)
+{
+  global $__BOND_HANDLES;
+  if(!array_key_exists($id, $__BOND_HANDLES))
+    throw new Exception("unknown handle $id");
+  return $__BOND_HANDLES[$id];
+}
+
+function __BOND_ref($el)
+{
+  // references are compiled once as a closure
+  global $__BOND_REFS;
+  if(count($el) > 2)
+  {
+    try
+    {
+      $__BOND_REFS[$el[1]] = __BOND_eval("function()
+      {
+        extract(\$GLOBALS, EXTR_REFS);
+        return ($el[2]);
+      }");
+    }
+    catch(Exception $e)
+    {
+      // keep the error to raise it on each use
+      $__BOND_REFS[$el[1]] = $e;
+    }
+  }
+  if(!array_key_exists($el[1], $__BOND_REFS))
+    throw new Exception("unknown reference $el[1]");
+  $ref = $__BOND_REFS[$el[1]];
+  if($ref instanceof Exception)
+    throw $ref;
+  __BOND_clear_error();
+  $ret = @$ref();
+  $err = __BOND_get_error();
+  if($err) throw new Exception($err['message']);
+  return $ret;
+}
+
+function __BOND_xargs($xargs)
+{
+  $ret = array();
+  foreach($xargs as &$el)
+  {
+    if($el[0] == 2)
+      $ret[] = __BOND_handle_value($el[1]);
+    elseif($el[0] == 3)
+      $ret[] = __BOND_ref($el);
+    else
+      $ret[] = (!$el[0]? $el[1]: __BOND_eval($el[1]));
+  }
+  return $ret;
+}
+
+function __BOND_handle($op, $args)
+{
+  global $__BOND_HANDLES, $__BOND_HANDLES_ID, $__BOND_REFS;
+  switch($op)
+  {
+  case "call":
+    $ret = __BOND_call($args[0], __BOND_xargs($args[1]));
+    $__BOND_HANDLES[++$__BOND_HANDLES_ID] = $ret;
+    return $__BOND_HANDLES_ID;
+
+  case "fetch":
+    return __BOND_handle_value($args[0]);
+
+  case "getitem":
+    $value = __BOND_handle_value($args[0]);
+    $key = $args[1];
+    if(is_array($value) || $value instanceof ArrayAccess)
+      return $value[$key];
+    if(is_object($value))
+      return $value->$key;
+    throw new Exception("cannot index a value of type " . gettype($value));
+
+  case "release":
+    foreach($args[0] as $id)
+      unset($__BOND_HANDLES[$id]);
+    return null;
+
+  case "unref":
+    foreach($args[0] as $id)
+      unset($__BOND_REFS[$id]);
+    return null;
+  }
+  throw new Exception("unknown handle operation $op");
+}
+
+function __BOND_repl()
+{
+  global $__BOND_BUFFERS, $__BOND_REDIRECTS, $__BOND_TRANS_EXCEPT, $__BOND_INTERRUPTIBLE;
+  while($line = __BOND_getline())
+  {
+    $line = explode(" ", $line, 2);
+    $cmd = $line[0];
+    $args = (count($line) > 1? __BOND_loads($line[1]): array());
+
+    $ret = null;
+    $err = null;
+    $__BOND_INTERRUPTIBLE = true;
+    switch($cmd)
+    {
+    case "EVAL":
+      try { $ret = __BOND_eval($args); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "EVAL_BLOCK":
+      try { __BOND_exec($args); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "EXPORT":
+      $name = $args;
+      if(function_exists($name))
+	$err = "Function \"$name\" already exists";
+      else
+      {
+	$code = "function $name() { return __BOND_remote('$args', func_get_args()); }";
+	__BOND_clear_error();
+	@eval($code);
+	$err = __BOND_get_error();
+      }
+      break;
+
+    case "CALL":
+      try { $ret = __BOND_call($args[0], $args[1]); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "XCALL":
+      try { $ret = __BOND_call($args[0], __BOND_xargs($args[1])); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "HANDLE":
+      try { $ret = __BOND_handle($args[0], array_slice($args, 1)); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "BATCH":
+      // failing calls are returned in place of their result
+      $ret = array();
+      foreach($args[1] as $xargs)
+      {
+	try { $ret[] = array("RETURN", __BOND_call($args[0], $xargs)); }
+	catch(Exception $e)
+	{
+	  $ret[] = array("EXCEPT", ($__BOND_TRANS_EXCEPT? $e: $e->getMessage()));
+	}
+      }
+      break;
+
+    case "REDIRECT":
+      try { $ret = __BOND_redirect($args[0], $args[1]); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "FORK":
+      try { $ret = __BOND_fork($args); }
+      catch(Exception $e) { $err = $e; }
+      break;
+
+    case "RETURN":
+      return $args;
+
+    case "EXCEPT":
+      throw new Exception($args);
+
+    case "ERROR":
+      throw new _BOND_SerializationException($args);
+
+    default:
+      exit(1);
+    }
+    $__BOND_INTERRUPTIBLE = false;
+
+    // redirected channels
+    ob_flush();
+    foreach($__BOND_BUFFERS as $chan => &$buf)
+    {
+      if(strlen($buf))
+      {
+	$code = __BOND_dumps(array($chan, $buf));
+	__BOND_sendline("OUTPUT $code");
+	$buf = "";
+      }
+    }
+    unset($buf);
+    foreach($__BOND_REDIRECTS as $stream)
+      fflush($stream);
+
+    // error state
+    $state = "RETURN";
+    if($err)
+    {
+      if($err instanceOf _BOND_SerializationException)
+      {
+	$state = "ERROR";
+	$ret = $err->getMessage();
+      }
+      else
+      {
+	$state = "EXCEPT";
+	if($err instanceOf Exception)
+	  $ret = ($__BOND_TRANS_EXCEPT? $err: $err->getMessage());
+	else
+	  $ret = @"$err";
+      }
+    }
+    $code = null;
+    try
+    {
+      $code = __BOND_dumps($ret);
+    }
+    catch(Exception $e)
+    {
+      $state = "ERROR";
+      $code = __BOND_dumps($e->getMessage());
+      if($cmd == "BATCH" && !$err)
+      {
+	// values that cannot be encoded only fail their own call
+	foreach($ret as &$item)
+	{
+	  try { __BOND_dumps($item); }
+	  catch(Exception $e) { $item = array("ERROR", $e->getMessage()); }
+	}
+	unset($item);
+	$state = "RETURN";
+	$code = __BOND_dumps($ret);
+      }
+    }
+    __BOND_sendline("$state $code");
+  }
+  return 0;
+}
+
+function __BOND_exit()
+{
+  // skip any destructor or shutdown function acting on the parent's
+  // resources
+  if(function_exists('posix_kill'))
+    posix_kill(posix_getpid(), SIGKILL);
+  exit(0);
+}
+
+function __BOND_fork($path)
+{
+  // fork twice, so that the child is reparented right away: the interpreter
+  // is never left with a zombie, nor needs to ignore SIGCHLD
+  global $__BOND_BUFFERS, $__BOND_CHANNELS;
+  if(!function_exists('pcntl_fork'))
+    throw new Exception("forking requires the pcntl extension");
+  $pipe = stream_socket_pair(STREAM_PF_UNIX, STREAM_SOCK_STREAM, STREAM_IPPROTO_IP);
+  $pid = pcntl_fork();
+  if($pid < 0)
+    throw new Exception("cannot fork the interpreter");
+  if($pid)
+  {
+    fclose($pipe[1]);
+    $child = stream_get_contents($pipe[0]);
+    fclose($pipe[0]);
+    pcntl_waitpid($pid, $status);
+    if(!$child)
+      throw new Exception("cannot fork the interpreter");
+    return (int)$child;
+  }
+  try
+  {
+    fclose($pipe[0]);
+    $pid = pcntl_fork();
+    if($pid)
+    {
+      if($pid > 0) fwrite($pipe[1], "$pid");
+      __BOND_exit();
+    }
+    fclose($pipe[1]);
+
+    // the socket replaces stdin and stdout (the descriptors themselves
+    // cannot be replaced from PHP)
+    $sock = stream_socket_client("unix://$path");
+    if($sock)
+    {
+      $__BOND_CHANNELS['STDIN'] = $sock;
+      $__BOND_CHANNELS['STDOUT'] = $sock;
+      foreach($__BOND_BUFFERS as &$buf)
+	$buf = "";
+      unset($buf);
+      __BOND_repl();
+      __BOND_sendline("BYE");
+    }
+  }
+  catch(Exception $e) {}
+  __BOND_exit();
+}
+
+function __BOND_start($proto, $trans_except)
+{
+  global $__BOND_TRANS_EXCEPT, $__BOND_ERROR_LEVEL;
+  ob_start('__BOND_output');
+
+  $__BOND_TRANS_EXCEPT = (bool)($trans_except);
+  $__BOND_ERROR_LEVEL = error_reporting();
+  set_error_handler('__BOND_error_handler');
+
+  // features depending on optional extensions
+  $ready = strtoupper("ready");
+  $disabled = array();
+  if(!function_exists('pcntl_fork'))
+    $disabled[] = "FORK";
+  if(function_exists('pcntl_async_signals'))
+  {
+    pcntl_async_signals(true);
+    pcntl_signal(SIGINT, '__BOND_sigint');
+  }
+  else
+    $disabled[] = "INTERRUPT";
+  if($disabled)
+    $ready .= " " . json_encode(array("disabled" => $disabled));
+  __BOND_sendline($ready);
+  $ret = __BOND_repl();
+  __BOND_sendline("BYE");
+  exit($ret);
+}
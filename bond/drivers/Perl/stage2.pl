@@ -0,0 +1,425 @@
+# bond Perl interface setup
+use strict;
+use warnings;
+require IO::Handle;
+require IO::String;
+require Data::Dump;
+require JSON;
+require Scalar::Util;
+
+
+# Channels and buffers
+my %__BOND_BUFFERS =
+(
+  "STDOUT" => IO::String->new(),
+  "STDERR" => IO::String->new()
+);
+
+my %__BOND_REDIRECTS;
+
+sub __BOND_redirect($$)
+{
+  my ($chan, $path) = @_;
+  die "unknown channel \"$chan\"\n" unless exists($__BOND_BUFFERS{$chan});
+  my $stream = $__BOND_BUFFERS{$chan};
+  if(defined($path))
+  {
+    open(my $file, ">>", $path) or die "cannot open $path: $!\n";
+    $stream = $file;
+  }
+  my $old = delete($__BOND_REDIRECTS{$chan});
+  close($old) if defined($old);
+  $__BOND_REDIRECTS{$chan} = $stream if defined($path);
+  no strict 'refs';
+  *{"main::$chan"} = $stream;
+}
+
+my %__BOND_CHANNELS =
+(
+  "STDIN" => *STDIN,
+  "STDOUT" => *STDOUT,
+  "STDERR" => *STDERR
+);
+
+
+# Our minimal exception signature
+{
+  package _BOND_SerializationException;
+
+  use overload '""' => sub { __PACKAGE__ . ': ' . ${shift()} . '\n' };
+
+  sub new
+  {
+    my ($self, $message) = @_;
+    return bless \$message, $self;
+  }
+}
+
+
+# Serialization methods
+my $__BOND_JSON = JSON->new()->allow_nonref();
+
+sub __BOND_dumps
+{
+  my $data = shift;
+  my $code = eval { $__BOND_JSON->encode($data) };
+  die _BOND_SerializationException->new("cannot encode $data") if $@;
+  return $code;
+}
+
+sub __BOND_loads
+{
+  return $__BOND_JSON->decode(@_);
+}
+
+
+# Define our own i/o methods
+sub __BOND_getline()
+{
+  my $stdin = $__BOND_CHANNELS{STDIN};
+  my $line = <$stdin>;
+  chomp($line) if defined($line);
+  return $line;
+}
+
+sub __BOND_sendline
+{
+  my $line = shift // "";
+  my $stdout = $__BOND_CHANNELS{STDOUT};
+  print $stdout "$line\n";
+}
+
+
+# Interrupts: SIGINT only dies while evaluating a request
+our $__BOND_INTERRUPTIBLE = 0;
+
+sub __BOND_sigint
+{
+  die "interrupted\n" if $__BOND_INTERRUPTIBLE;
+}
+
+
+# Recursive repl
+my $__BOND_TRANS_EXCEPT;
+
+sub __BOND_remote($$)
+{
+  my ($name, $args) = @_;
+  local $__BOND_INTERRUPTIBLE = 0;
+  my $code = __BOND_dumps([$name, $args]);
+  __BOND_sendline("CALL $code");
+  return __BOND_repl();
+}
+
+sub __BOND_eval
+{
+  # we use a stub function to reset Perl and hide our local scope
+  no strict;
+  no warnings;
+  local $__BOND_INTERRUPTIBLE = 1;
+  eval shift;
+}
+
+sub __BOND_call($$)
+{
+  # NOTE: note that we use "dump" to evaluate the command as a pure string.
+  #       This allows us to execute *most* perl special forms consistenly.
+  # TODO: special-case builtins to allow transparent invocation and higher
+  #       performance with regular functions.
+  my ($name, $args) = @_;
+  my $args_ = Data::Dump::dump(@$args);
+  $args_ = "($args_)" if @$args == 1;
+  my $ret = [__BOND_eval("$name $args_")];
+  $ret = $ret->[0] if @$ret == 1;
+  return $ret;
+}
+
+# Values kept by reference
+our %__BOND_HANDLES;
+my $__BOND_HANDLES_ID = 0;
+our %__BOND_REFS;
+
+sub __BOND_handle_value($)
+{
+  my $id = shift;
+  die "unknown handle $id\n" unless exists($__BOND_HANDLES{$id});
+  return $__BOND_HANDLES{$id};
+}
+
+sub __BOND_xarg($)
+{
+  # handles are referenced by name, so that the value itself is passed
+  my $el = shift;
+  if($el->[0] == 2)
+  {
+    __BOND_handle_value($el->[1]);
+    return "\$main::__BOND_HANDLES{" . int($el->[1]) . "}";
+  }
+  if($el->[0] == 3)
+  {
+    # references are compiled once as an anonymous sub
+    my $id = int($el->[1]);
+    if(@$el > 2)
+    {
+      my $sub = __BOND_eval("sub { $el->[2] }");
+      my $e = $@;
+      $__BOND_REFS{$id} = ($e? sub { die $e }: $sub);
+    }
+    die "unknown reference $id\n" unless exists($__BOND_REFS{$id});
+    return "scalar(\$main::__BOND_REFS{$id}->())";
+  }
+  return Data::Dump::dump(!$el->[0]? $el->[1]: scalar(__BOND_eval($el->[1])));
+}
+
+sub __BOND_xcall($$)
+{
+  my ($name, $xargs) = @_;
+  my $xargs_ = join(",", map { __BOND_xarg($_) } @$xargs);
+  my $ret = [__BOND_eval("$name ($xargs_)")];
+  die $@ if $@;
+  $ret = $ret->[0] if @$ret == 1;
+  return $ret;
+}
+
+sub __BOND_handle
+{
+  my ($op, @args) = @_;
+  if($op eq "call")
+  {
+    my $ret = __BOND_xcall($args[0], $args[1]);
+    $__BOND_HANDLES{++$__BOND_HANDLES_ID} = $ret;
+    return $__BOND_HANDLES_ID;
+  }
+  elsif($op eq "fetch")
+  {
+    return __BOND_handle_value($args[0]);
+  }
+  elsif($op eq "getitem")
+  {
+    my $value = __BOND_handle_value($args[0]);
+    return $value->{$args[1]} if ref($value) eq "HASH";
+    return $value->[$args[1]] if ref($value) eq "ARRAY";
+    die "cannot index a value of type " . (ref($value) || "SCALAR") . "\n";
+  }
+  elsif($op eq "release")
+  {
+    delete @__BOND_HANDLES{@{$args[0]}};
+    return undef;
+  }
+  elsif($op eq "unref")
+  {
+    delete @__BOND_REFS{@{$args[0]}};
+    return undef;
+  }
+  die "unknown handle operation $op\n";
+}
+
+sub __BOND_repl()
+{
+  my $SENTINEL = 1;
+  while(my $line = __BOND_getline())
+  {
+    my ($cmd, $args) = split(/ /, $line, 2);
+    $args = __BOND_loads($args) if defined($args);
+
+    my $ret = undef;
+    my $err = undef;
+    if($cmd eq "EVAL")
+    {
+      # force evaluation in array context to avoid swallowing lists
+      $ret = [__BOND_eval($args)];
+      $err = $@;
+      $ret = $ret->[0] if @$ret == 1;
+    }
+    elsif($cmd eq "EVAL_BLOCK")
+    {
+      # discard return, as with Perl it would most likely be a CODE ref
+      __BOND_eval($args);
+      $err = $@;
+    }
+    elsif($cmd eq "EXPORT")
+    {
+      my $code = "sub $args { __BOND_remote('$args', \\\@_) }";
+      $ret = eval $code;
+      $err = $@;
+    }
+    elsif($cmd eq "CALL")
+    {
+      $ret = __BOND_call($args->[0], $args->[1]);
+      $err = $@;
+    }
+    elsif($cmd eq "XCALL")
+    {
+      $ret = eval { __BOND_xcall($args->[0], $args->[1]) };
+      $err = $@;
+    }
+    elsif($cmd eq "BATCH")
+    {
+      # failing calls are returned in place of their result
+      $ret = [];
+      for my $xargs(@{$args->[1]})
+      {
+	my $val = __BOND_call($args->[0], $xargs);
+	if($@)
+	{
+	  push(@$ret, ["EXCEPT", ($__BOND_TRANS_EXCEPT? $@: "$@")]);
+	}
+	else
+	{
+	  push(@$ret, ["RETURN", $val]);
+	}
+      }
+    }
+    elsif($cmd eq "HANDLE")
+    {
+      $ret = eval { __BOND_handle(@$args) };
+      $err = $@;
+    }
+    elsif($cmd eq "REDIRECT")
+    {
+      $ret = eval { __BOND_redirect($args->[0], $args->[1]) };
+      $err = $@;
+    }
+    elsif($cmd eq "FORK")
+    {
+      $ret = eval { __BOND_fork($args) };
+      $err = $@;
+    }
+    elsif($cmd eq "RETURN")
+    {
+      return $args;
+    }
+    elsif($cmd eq "EXCEPT")
+    {
+      die $args;
+    }
+    elsif($cmd eq "ERROR")
+    {
+      die _BOND_SerializationException->new($args);
+    }
+    else
+    {
+      exit(1);
+    }
+
+    # redirected channels
+    while(my ($channel, $buffer) = each %__BOND_BUFFERS)
+    {
+      if(tell($buffer))
+      {
+	my $output = ${$buffer->string_ref};
+	my $code = __BOND_dumps([$channel, $output]);
+	__BOND_sendline("OUTPUT $code");
+	seek($buffer, 0, 0);
+	truncate($buffer, 0);
+      }
+    }
+    $_->flush() for values(%__BOND_REDIRECTS);
+
+    # error state
+    my $state = "RETURN";
+    if($err)
+    {
+      if(Scalar::Util::blessed($err) && $err->isa('_BOND_SerializationException'))
+      {
+	$state = "ERROR";
+	$ret = $$err;
+      }
+      else
+      {
+	$state = "EXCEPT";
+	$ret = ($__BOND_TRANS_EXCEPT? $err: "$err");
+      }
+    }
+    my $code = eval { __BOND_dumps($ret) };
+    if($@ && $cmd eq "BATCH" && $state eq "RETURN")
+    {
+      # values that cannot be encoded only fail their own call
+      for my $item(@$ret)
+      {
+	eval { __BOND_dumps($item) };
+	$item = ["ERROR", ${$@}] if $@;
+      }
+      $code = eval { __BOND_dumps($ret) };
+    }
+    if($@)
+    {
+      $state = "ERROR";
+      $code = __BOND_dumps(${$@});
+    }
+    __BOND_sendline("$state $code");
+  }
+  return 0;
+}
+
+sub __BOND_fork($)
+{
+  # fork twice, so that the child is reparented right away: the interpreter
+  # is never left with a zombie, nor needs to ignore SIGCHLD
+  my $path = shift;
+  require POSIX;
+  require Socket;
+  pipe(my $rd, my $wr) or die "cannot fork the interpreter: $!\n";
+  my $pid = fork();
+  die "cannot fork the interpreter: $!\n" unless defined($pid);
+  if($pid)
+  {
+    close($wr);
+    my $child = <$rd>;
+    close($rd);
+    waitpid($pid, 0);
+    die "cannot fork the interpreter\n" unless $child;
+    return int($child);
+  }
+  eval
+  {
+    close($rd);
+    $pid = fork();
+    if(!defined($pid) || $pid)
+    {
+      syswrite($wr, $pid) if $pid;
+      POSIX::_exit(0);
+    }
+    close($wr);
+
+    # the socket replaces stdin, stdout and stderr
+    socket(my $sock, Socket::PF_UNIX(), Socket::SOCK_STREAM(), 0) or die;
+    connect($sock, Socket::pack_sockaddr_un($path)) or die;
+    POSIX::dup2(fileno($sock), $_) for 0..2;
+    close($sock);
+    open(my $stdin, "<&=", 0) or die;
+    open(my $stdout, ">&=", 1) or die;
+    $stdout->autoflush();
+    $__BOND_CHANNELS{STDIN} = $stdin;
+    $__BOND_CHANNELS{STDOUT} = $stdout;
+    for my $buffer(values %__BOND_BUFFERS)
+    {
+      seek($buffer, 0, 0);
+      truncate($buffer, 0);
+    }
+    __BOND_repl();
+    __BOND_sendline("BYE");
+  };
+  # skip any END block or destructor acting on the parent's resources
+  POSIX::_exit(0);
+}
+
+sub __BOND_start($$)
+{
+  my ($proto, $trans_except) = @_;
+
+  *STDIN = IO::Handle->new();
+  *STDOUT = $__BOND_BUFFERS{STDOUT};
+  *STDERR = $__BOND_BUFFERS{STDERR};
+  $SIG{__WARN__} = sub
+  {
+    print STDERR shift;
+  };
+  $SIG{INT} = \&__BOND_sigint;
+
+  $__BOND_TRANS_EXCEPT = $trans_except;
+  __BOND_sendline(uc("ready"));
+  my $ret = __BOND_repl();
+  __BOND_sendline("BYE");
+  exit($ret);
+}
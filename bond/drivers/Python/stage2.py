@@ -0,0 +1,626 @@
+# bond Python interface setup
+import io
+import json
+import os
+import sys
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+# Redirect normal output
+def __BOND_buffer_stdio(obj):
+    if isinstance(obj, io.TextIOBase):
+        ret = io.TextIOWrapper(io.BytesIO())
+        ret.getvalue = lambda: ret.buffer.getvalue().decode(ret.encoding)
+    else:
+        import cStringIO
+        ret = cStringIO.StringIO()
+    return ret
+
+__BOND_BUFFERS = {
+    "STDOUT": __BOND_buffer_stdio(sys.stdout),
+    "STDERR": __BOND_buffer_stdio(sys.stderr)
+}
+
+__BOND_REDIRECTS = {}
+
+def __BOND_redirect(chan, path):
+    if chan not in __BOND_BUFFERS:
+        raise Exception('unknown channel "{chan}"'.format(chan=chan))
+    stream = __BOND_BUFFERS[chan]
+    if path is not None:
+        stream = open(path, 'a')
+    old = __BOND_REDIRECTS.pop(chan, None)
+    if old is not None:
+        old.close()
+    if path is not None:
+        __BOND_REDIRECTS[chan] = stream
+    setattr(sys, chan.lower(), stream)
+
+def __BOND_raw_stdio(obj):
+    return obj.buffer if isinstance(obj, io.TextIOBase) else obj
+
+__BOND_CHANNELS = {
+    "STDIN": __BOND_raw_stdio(sys.stdin),
+    "STDOUT": __BOND_raw_stdio(sys.stdout),
+    "STDERR": __BOND_raw_stdio(sys.stderr)
+}
+
+
+# Define our own i/o methods
+import struct
+__BOND_FRAMING = "LINE"
+__BOND_COMMANDS = ['EVAL', 'EVAL_BLOCK', 'CALL', 'XCALL', 'EXPORT',
+                   'RETURN', 'OUTPUT', 'EXCEPT', 'ERROR', 'BYE', 'SHM', 'BATCH',
+                   'FORK', 'HANDLE', 'LINK', 'REDIRECT']
+__BOND_HEADER = struct.Struct('!BQ')
+
+def __BOND_getline():
+    return __BOND_CHANNELS['STDIN'].readline().rstrip()
+
+def __BOND_readall(readinto, size):
+    # read "size" bytes into a mutable buffer, so that values decoded in place
+    # (such as PICKLE5 buffers) are writable
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        length = readinto(view[pos:])
+        if not length:
+            return None
+        pos += length
+    return buf
+
+def __BOND_recv():
+    if __BOND_FRAMING == "LINE":
+        line = __BOND_getline()
+        if len(line) == 0:
+            return None, None
+        line = line.split(b' ', 1)
+        return line[0].decode('ascii'), (line[1] if len(line) > 1 else None)
+    stdin = __BOND_CHANNELS['STDIN']
+    hdr = stdin.read(__BOND_HEADER.size)
+    if len(hdr) < __BOND_HEADER.size:
+        return None, None
+    code, size = __BOND_HEADER.unpack(hdr)
+    if not size:
+        return __BOND_COMMANDS[code], None
+    buf = __BOND_readall(stdin.readinto, size)
+    if buf is None:
+        return None, None
+    return __BOND_COMMANDS[code], buf
+
+def __BOND_sendline(line=b''):
+    stdout = __BOND_CHANNELS['STDOUT']
+    stdout.write(line + b'\n')
+    stdout.flush()
+
+def __BOND_size(code):
+    # payloads can also be a list of buffers, written out in order
+    if isinstance(code, list):
+        return sum(len(chunk) for chunk in code)
+    return len(code)
+
+__BOND_SHM = None
+
+def __BOND_shm_dump(state, code):
+    import mmap, tempfile
+    chunks = code if isinstance(code, list) else [code]
+    size = __BOND_size(chunks)
+    fd, path = tempfile.mkstemp(prefix='bond-', dir=__BOND_SHM['path'])
+    os.ftruncate(fd, size)
+    buf = mmap.mmap(fd, size)
+    pos = 0
+    for chunk in chunks:
+        buf[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    buf.close()
+    os.close(fd)
+    return json.dumps([state, os.path.basename(path), 0, size]).encode('utf-8')
+
+def __BOND_shm_load(code):
+    # the payload is a view of the mapping, which stays alive as long as the
+    # values decoded in place (such as PICKLE5 buffers)
+    import mmap
+    state, name, offset, length = json.loads(code.decode('utf-8'))
+    path = os.path.join(__BOND_SHM['path'], os.path.basename(name))
+    fd = os.open(path, os.O_RDONLY)
+    os.unlink(path)
+    buf = mmap.mmap(fd, offset + length, access=mmap.ACCESS_COPY)
+    os.close(fd)
+    try:
+        return state, memoryview(buf)[offset:offset + length]
+    except TypeError:
+        # mmap objects only export the new buffer interface on Python 3
+        return state, buf[offset:offset + length]
+
+def __BOND_sendstate(state, code=None):
+    if __BOND_SHM is not None and code is not None \
+       and __BOND_size(code) >= __BOND_SHM['threshold']:
+        state, code = "SHM", __BOND_shm_dump(state, code)
+    if __BOND_FRAMING != "LINE":
+        chunks = code if isinstance(code, list) else [code or b'']
+        size = __BOND_size(chunks)
+        stdout = __BOND_CHANNELS['STDOUT']
+        stdout.write(__BOND_HEADER.pack(__BOND_COMMANDS.index(state), size))
+        for chunk in chunks:
+            stdout.write(chunk)
+        stdout.flush()
+        return
+    line = bytes(state.encode('ascii'))
+    if code is not None:
+        line = line + b' ' + code
+    __BOND_sendline(line)
+
+
+# Serialization protocols
+class __BOND_PICKLE(object):
+    @staticmethod
+    def dumps(*args):
+        return repr(pickle.dumps(args, 0)).encode('utf-8')
+
+    @staticmethod
+    def loads(buf):
+        dec = eval(bytes(buf).decode('utf-8'))
+        if not isinstance(dec, bytes): dec = dec.encode('utf-8')
+        return pickle.loads(dec)[0]
+
+
+if pickle.HIGHEST_PROTOCOL >= 5:
+    class _BOND_Pickler(pickle.Pickler):
+        def reducer_override(self, obj):
+            if isinstance(obj, memoryview):
+                buf = pickle.PickleBuffer(obj)
+                try:
+                    buf.raw()
+                except BufferError:
+                    buf = obj.tobytes()
+                return (bytes, (buf,))
+            numpy = sys.modules.get('numpy')
+            if numpy is not None and type(obj) is numpy.ndarray and not obj.dtype.hasobject:
+                if not (obj.flags.c_contiguous or obj.flags.f_contiguous):
+                    obj = numpy.ascontiguousarray(obj)
+                buf = pickle.PickleBuffer(obj)
+                return (numpy.ndarray, (obj.shape, obj.dtype, buf, 0, obj.strides))
+            return NotImplemented
+
+    class __BOND_PICKLE5(object):
+        @staticmethod
+        def dumps(*args):
+            data = io.BytesIO()
+            buffers = []
+            def callback(buf):
+                if buf.raw().nbytes < 65536:
+                    return True
+                buffers.append(buf)
+            _BOND_Pickler(data, 5, buffer_callback=callback).dump(args)
+            data = data.getbuffer()
+            buffers = [buf.raw() for buf in buffers]
+            header = struct.pack('!QI', len(data), len(buffers))
+            if buffers:
+                header += struct.pack('!{}Q'.format(len(buffers)), *[b.nbytes for b in buffers])
+            return [header, data] + buffers
+
+        @staticmethod
+        def loads(buf):
+            view = memoryview(buf)
+            size, count = struct.unpack_from('!QI', view)
+            pos = 12
+            lengths = struct.unpack_from('!{}Q'.format(count), view, pos)
+            pos += 8 * count
+            data = view[pos:pos + size]
+            pos += size
+            buffers = []
+            for length in lengths:
+                buffers.append(view[pos:pos + length])
+                pos += length
+            return pickle.loads(data, buffers=buffers)[0]
+
+
+class __BOND_JSON(object):
+    @staticmethod
+    def loads(buf):
+        return json.loads(bytes(buf).decode('utf-8'))
+
+    @staticmethod
+    def dumps(*args):
+        return json.dumps(*args, skipkeys=False).encode('utf-8')
+
+
+# Serialization methods
+class _BOND_SerializationException(TypeError):
+    pass
+
+__BOND_PROTO = None
+
+def __BOND_dumps(*args):
+    try:
+        ret = __BOND_PROTO.dumps(*args)
+    except:
+        raise _BOND_SerializationException("cannot encode {data}".format(data=str(args)))
+    return ret
+
+def __BOND_loads(buf):
+    return __BOND_PROTO.loads(buf)
+
+
+# Direct links: calls from other interpreters are served while waiting for
+# input, from sockets set up by the host
+import select
+__BOND_LINKS = {}
+
+class _BOND_Input(io.RawIOBase):
+    def __init__(self, fd, links, serve):
+        self.fd = fd
+        self.links = links
+        self.serve = serve
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while self.links:
+            ready = select.select([self.fd] + list(self.links), [], [])[0]
+            if self.fd in ready:
+                break
+            for fd in ready:
+                self.serve(fd)
+        data = os.read(self.fd, len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+def __BOND_link_recv(sock):
+    hdr = b''
+    while len(hdr) < __BOND_HEADER.size:
+        data = sock.recv(__BOND_HEADER.size - len(hdr))
+        if not data:
+            return None, None
+        hdr += data
+    code, size = __BOND_HEADER.unpack(hdr)
+    buf = __BOND_readall(sock.recv_into, size)
+    if buf is None:
+        return None, None
+    return __BOND_COMMANDS[code], buf
+
+def __BOND_link_send(sock, state, code):
+    if isinstance(code, list):
+        code = b''.join(code)
+    sock.sendall(__BOND_HEADER.pack(__BOND_COMMANDS.index(state), len(code)) + code)
+
+def __BOND_link_serve(fd):
+    sock, proto = __BOND_LINKS[fd]
+    if proto is None:
+        # listening socket: accept a single connection
+        conn = sock.accept()[0]
+        del __BOND_LINKS[fd]
+        sock.close()
+        __BOND_LINKS[conn.fileno()] = (conn, globals()["__BOND_" + __BOND_LINK_PROTOS.pop(fd)])
+        return
+    state, code = __BOND_link_recv(sock)
+    if state is None:
+        del __BOND_LINKS[fd]
+        sock.close()
+        return
+    try:
+        name, args = proto.loads(code)
+        state = "RETURN"
+        ret = eval(name, globals())(*args)
+    except Exception as e:
+        state = "EXCEPT"
+        ret = e if __BOND_TRANS_EXCEPT else str(e)
+    try:
+        code = proto.dumps(ret)
+    except Exception as e:
+        state = "ERROR"
+        code = proto.dumps(str(e))
+    __BOND_link_send(sock, state, code)
+
+__BOND_LINK_PROTOS = {}
+
+def __BOND_link(op, path, *args):
+    import socket
+    if op == "close":
+        # the listener of a link which couldn't be connected
+        for fd, (sock, proto) in list(__BOND_LINKS.items()):
+            if proto is None and sock.getsockname() == path:
+                del __BOND_LINKS[fd]
+                del __BOND_LINK_PROTOS[fd]
+                sock.close()
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if op == "listen":
+        sock.bind(path)
+        sock.listen(1)
+        __BOND_LINK_PROTOS[sock.fileno()] = args[0]
+        __BOND_LINKS[sock.fileno()] = (sock, None)
+        return
+    name, remote, proto = args
+    proto = globals()["__BOND_" + proto]
+    sock.connect(path)
+    def call(*args):
+        try:
+            code = proto.dumps([name, list(args)])
+        except Exception:
+            raise _BOND_SerializationException("cannot encode {data}".format(data=str(args)))
+        __BOND_link_send(sock, "CALL", code)
+        state, code = __BOND_link_recv(sock)
+        if state is None:
+            raise Exception("link to {name} closed".format(name=name))
+        ret = proto.loads(code)
+        if state == "RETURN":
+            return ret
+        elif state == "EXCEPT":
+            raise ret if isinstance(ret, Exception) else Exception(ret)
+        raise _BOND_SerializationException(ret)
+    globals()[remote] = call
+
+
+# Interrupts: SIGINT only raises KeyboardInterrupt while evaluating a request
+__BOND_INTERRUPTIBLE = [False]
+
+def __BOND_sigint(signum, frame):
+    if __BOND_INTERRUPTIBLE[0]:
+        raise KeyboardInterrupt("interrupted")
+
+def __BOND_eval(func, *args):
+    __BOND_INTERRUPTIBLE[0] = True
+    try:
+        return func(*args)
+    finally:
+        __BOND_INTERRUPTIBLE[0] = False
+
+
+# Recursive repl
+__BOND_TRANS_EXCEPT = None
+
+def __BOND_remote(name, args):
+    interruptible = __BOND_INTERRUPTIBLE[0]
+    __BOND_INTERRUPTIBLE[0] = False
+    try:
+        __BOND_sendstate("CALL", __BOND_dumps([name, args]))
+        return __BOND_repl()
+    finally:
+        __BOND_INTERRUPTIBLE[0] = interruptible
+
+def __BOND_export(name):
+    globals()[name] = lambda *args: __BOND_remote(name, args)
+
+__BOND_HANDLES = {}
+__BOND_HANDLES_ID = [0]
+__BOND_REFS = {}
+
+def __BOND_xarg(el):
+    if el[0] == 2:
+        return __BOND_HANDLES[el[1]]
+    if el[0] == 3:
+        if len(el) > 2:
+            try:
+                __BOND_REFS[el[1]] = compile(el[2], "<ref>", "eval")
+            except SyntaxError:
+                # keep the source to raise the same error on each use
+                __BOND_REFS[el[1]] = el[2]
+        return eval(__BOND_REFS[el[1]], globals())
+    return el[1] if not el[0] else eval(el[1], globals())
+
+def __BOND_handle(op, *args):
+    if op == "call":
+        func = eval(args[0], globals())
+        ret = func(*[__BOND_xarg(el) for el in args[1]])
+        __BOND_HANDLES_ID[0] += 1
+        __BOND_HANDLES[__BOND_HANDLES_ID[0]] = ret
+        return __BOND_HANDLES_ID[0]
+    elif op == "fetch":
+        return __BOND_HANDLES[args[0]]
+    elif op == "getitem":
+        return __BOND_HANDLES[args[0]][args[1]]
+    elif op == "release":
+        for id in args[0]:
+            __BOND_HANDLES.pop(id, None)
+    elif op == "unref":
+        for id in args[0]:
+            __BOND_REFS.pop(id, None)
+    else:
+        raise ValueError("unknown handle operation " + str(op))
+
+def __BOND_repl():
+    SENTINEL = 1
+    while True:
+        cmd, code = __BOND_recv()
+        if cmd is None:
+            break
+        if cmd == "SHM":
+            cmd, code = __BOND_shm_load(code)
+        args = __BOND_loads(code) if code is not None else []
+
+        ret = None
+        err = None
+        if cmd == "EVAL" or cmd == "EVAL_BLOCK":
+            try:
+                mode = 'eval' if cmd == "EVAL" else 'exec'
+                ret = __BOND_eval(lambda: eval(compile(args, '<string>', mode), globals()))
+            except (Exception, KeyboardInterrupt) as e:
+                err = e
+
+        elif cmd == "EXPORT":
+            __BOND_export(args)
+
+        elif cmd == "CALL":
+            try:
+                ret = __BOND_eval(lambda: eval(args[0], globals())(*args[1]))
+            except (Exception, KeyboardInterrupt) as e:
+                err = e
+
+        elif cmd == "XCALL":
+            try:
+                ret = __BOND_eval(lambda: eval(args[0], globals())(
+                    *[__BOND_xarg(el) for el in args[1]]))
+            except (Exception, KeyboardInterrupt) as e:
+                err = e
+
+        elif cmd == "BATCH":
+            # failing calls are returned in place of their result
+            try:
+                func = eval(args[0], globals())
+                ret = []
+                def batch():
+                    for xargs in args[1]:
+                        try:
+                            ret.append(["RETURN", func(*xargs)])
+                        except Exception as e:
+                            ret.append(["EXCEPT", e if __BOND_TRANS_EXCEPT else str(e)])
+                __BOND_eval(batch)
+            except (Exception, KeyboardInterrupt) as e:
+                err = e
+
+        elif cmd == "HANDLE":
+            try:
+                ret = __BOND_eval(__BOND_handle, *args)
+            except (Exception, KeyboardInterrupt) as e:
+                err = e
+
+        elif cmd == "LINK":
+            try:
+                ret = __BOND_link(*args)
+            except Exception as e:
+                err = e
+
+        elif cmd == "REDIRECT":
+            try:
+                ret = __BOND_redirect(*args)
+            except Exception as e:
+                err = e
+
+        elif cmd == "FORK":
+            try:
+                ret = __BOND_fork(args)
+            except Exception as e:
+                err = e
+
+        elif cmd == "RETURN":
+            return args
+
+        elif cmd == "EXCEPT":
+            raise args if isinstance(args, Exception) else Exception(args)
+
+        elif cmd == "ERROR":
+            raise _BOND_SerializationException(args)
+
+        else:
+            exit(1)
+
+        # redirected channels
+        for chan, buf in __BOND_BUFFERS.items():
+            if buf.tell():
+                code = __BOND_dumps([chan, buf.getvalue()])
+                __BOND_sendstate("OUTPUT", code)
+                buf.seek(0)
+                buf.truncate(0)
+        for stream in __BOND_REDIRECTS.values():
+            stream.flush()
+
+        # error state
+        state = "RETURN"
+        if err is not None:
+            if isinstance(err, _BOND_SerializationException):
+                state = "ERROR"
+                ret = str(err)
+            else:
+                state = "EXCEPT"
+                ret = err if __BOND_TRANS_EXCEPT else str(err)
+        try:
+            code = __BOND_dumps(ret)
+        except Exception as e:
+            state = "ERROR"
+            code = __BOND_dumps(str(e))
+            if cmd == "BATCH" and err is None:
+                # values that cannot be encoded only fail their own call
+                for i, item in enumerate(ret):
+                    try:
+                        __BOND_dumps(item)
+                    except Exception as e:
+                        ret[i] = ["ERROR", str(e)]
+                state = "RETURN"
+                code = __BOND_dumps(ret)
+        __BOND_sendstate(state, code)
+
+    # stream ended
+    return 0
+
+
+def __BOND_fork(path):
+    # fork twice, so that the child is reparented right away: the interpreter
+    # is never left with a zombie, nor needs to ignore SIGCHLD
+    import socket
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid:
+        os.close(wfd)
+        with os.fdopen(rfd, 'rb') as fd:
+            child = fd.read()
+        os.waitpid(pid, 0)
+        if not child:
+            raise Exception("cannot fork the interpreter")
+        return int(child)
+    try:
+        os.close(rfd)
+        pid = os.fork()
+        if pid:
+            os.write(wfd, str(pid).encode('ascii'))
+            os._exit(0)
+        os.close(wfd)
+
+        # the socket replaces stdin, stdout and stderr
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        fd = sock.detach()
+        for std in range(3):
+            os.dup2(fd, std)
+        os.close(fd)
+        __BOND_CHANNELS['STDIN'] = io.open(0, 'rb', closefd=False)
+        __BOND_CHANNELS['STDOUT'] = io.open(1, 'wb', closefd=False)
+        for sock, proto in list(__BOND_LINKS.values()):
+            sock.close()
+        __BOND_LINKS.clear()
+        for buf in __BOND_BUFFERS.values():
+            buf.seek(0)
+            buf.truncate(0)
+        __BOND_repl()
+        __BOND_sendstate("BYE")
+    finally:
+        os._exit(0)
+
+
+def __BOND_start(proto, trans_except, options={}):
+    global __BOND_PROTO, __BOND_TRANS_EXCEPT, __BOND_FRAMING, __BOND_SHM
+    global __BOND_BUFFERS, __BOND_CHANNELS
+
+    ready = None
+    if proto == "PICKLE5" and "__BOND_PICKLE5" not in globals():
+        proto = options.get('fallback', ["JSON"])[0]
+        ready = json.dumps({"proto": proto}).encode('utf-8')
+    if proto == "PICKLE5":
+        __BOND_PROTO = __BOND_PICKLE5
+    elif proto == "PICKLE":
+        __BOND_PROTO = __BOND_PICKLE
+    elif proto == "JSON":
+        __BOND_PROTO = __BOND_JSON
+    else:
+        raise Exception('unknown protocol "{proto}"'.format(proto=proto))
+
+    sys.stdout = __BOND_BUFFERS['STDOUT']
+    sys.stderr = __BOND_BUFFERS['STDERR']
+    sys.stdin = open(os.devnull)
+
+    __BOND_TRANS_EXCEPT = trans_except
+    __BOND_CHANNELS['STDIN'] = io.BufferedReader(_BOND_Input(0, __BOND_LINKS, __BOND_link_serve))
+    import signal
+    signal.signal(signal.SIGINT, __BOND_sigint)
+    __BOND_sendstate("ready".upper(), ready)
+    __BOND_FRAMING = options.get('framing', "LINE")
+    __BOND_SHM = options.get('shm')
+    ret = __BOND_repl()
+    __BOND_sendstate("BYE")
+    exit(ret)
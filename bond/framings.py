@@ -0,0 +1,266 @@
+# Message framing
+import errno
+import json
+import mmap
+import os
+import struct
+
+
+# Incremental reader
+CHUNK_SIZE = 65536
+
+def _eof():
+    import pexpect
+    return pexpect.EOF('End Of File (EOF).')
+
+class Reader(object):
+    def __init__(self, proc, chunk_size=CHUNK_SIZE):
+        '''Read messages directly from the file descriptor of "proc" in
+        "chunk_size" chunks. Any data already buffered by pexpect is taken
+        over. Memory usage is bounded by the size of the current message.'''
+        self.proc = proc
+        self.chunk_size = chunk_size
+        self.buf = bytearray(proc.buffer)
+        self.pos = 0
+        proc.buffer = proc.string_type()
+
+    def _wait(self):
+        # pexpect is imported lazily by bond
+        import pexpect
+        fd = self.proc.child_fd
+        if fd not in pexpect.utils.select_ignore_interrupts([fd], [], [], self.proc.timeout)[0]:
+            raise pexpect.TIMEOUT('Timeout exceeded.')
+
+    def ready(self, timeout):
+        '''Return true if data can be read within "timeout" seconds'''
+        if self.buf:
+            return True
+        import pexpect
+        fd = self.proc.child_fd
+        return fd in pexpect.utils.select_ignore_interrupts([fd], [], [], max(timeout, 0))[0]
+
+    def _log(self, data):
+        for logfile in (self.proc.logfile, self.proc.logfile_read):
+            if logfile is not None:
+                logfile.write(bytes(data))
+                logfile.flush()
+
+    def _read(self, size):
+        self._wait()
+        try:
+            data = os.read(self.proc.child_fd, size)
+        except OSError as e:
+            # reading a pty after the child exited results in EIO
+            if e.errno != errno.EIO: raise
+            data = b''
+        if not data:
+            raise _eof()
+        self._log(data)
+        return data
+
+    def _readinto(self, view):
+        if not hasattr(os, 'readv'):
+            data = self._read(len(view))
+            view[:len(data)] = data
+            return len(data)
+        self._wait()
+        try:
+            size = os.readv(self.proc.child_fd, [view])
+        except OSError as e:
+            if e.errno != errno.EIO: raise
+            size = 0
+        if not size:
+            raise _eof()
+        self._log(view[:size])
+        return size
+
+    def readline(self):
+        '''Return the next line (without the terminating newline) as a single
+        contiguous bytearray. The search offset is kept across reads, so each
+        byte is scanned only once.'''
+        buf = self.buf
+        while True:
+            idx = buf.find(b'\n', self.pos)
+            if idx >= 0: break
+            self.pos = len(buf)
+            buf += self._read(self.chunk_size)
+        self.pos = 0
+        if idx + 1 == len(buf):
+            # hand over the whole buffer without copying
+            self.buf = bytearray()
+            del buf[idx:]
+            return buf
+        line = buf[:idx]
+        del buf[:idx + 1]
+        return line
+
+    def peek(self, size):
+        '''Return the next "size" bytes without consuming them'''
+        buf = self.buf
+        while len(buf) < size:
+            buf += self._read(self.chunk_size)
+        return buf[:size]
+
+    def read(self, size):
+        '''Read exactly "size" bytes and return them as a bytearray'''
+        buf = self.buf
+        self.pos = 0
+        if len(buf) >= size:
+            ret = buf[:size]
+            del buf[:size]
+            return ret
+        ret = bytearray(size)
+        have = len(buf)
+        ret[:have] = buf
+        self.buf = bytearray()
+        view = memoryview(ret)
+        try:
+            while have < size:
+                have += self._readinto(view[have:])
+        except BaseException:
+            # keep what was read (say, until a timeout) so that reading the
+            # message can be resumed later
+            self.buf = ret[:have]
+            raise
+        if hasattr(view, 'release'):
+            # let the caller resize the buffer (memoryview.release() is
+            # missing on Python 2, where dropping the view is enough)
+            view.release()
+        return ret
+
+
+class Incomplete(Exception):
+    pass
+
+class FeedReader(Reader):
+    '''A non-blocking Reader: data is only read from the file descriptor when
+    calling fill(). Requesting more data than buffered raises ``Incomplete``
+    without consuming anything, so that parsing can be retried later.'''
+
+    def fill(self):
+        self.buf += Reader._read(self, self.chunk_size)
+
+    def _read(self, size):
+        raise Incomplete()
+
+    def _readinto(self, view):
+        raise Incomplete()
+
+    def read(self, size):
+        if len(self.buf) < size:
+            raise Incomplete()
+        return Reader.read(self, size)
+
+
+# Payloads are either bytes, or a list of bytes-like chunks to be sent in
+# order (see protocols.PICKLE5)
+def size(code):
+    '''Return the length of the payload "code"'''
+    if isinstance(code, list):
+        return sum(len(chunk) for chunk in code)
+    return len(code)
+
+
+# LINE framing: "<CMD> <payload>\n"
+class LINE(object):
+    @staticmethod
+    def send(proc, cmd, code):
+        if isinstance(code, list):
+            code = b''.join(code)
+        proc.sendline(bytes(cmd.encode('ascii')) + b' ' + code)
+
+    @staticmethod
+    def recv(reader):
+        line = reader.readline()
+        idx = line.find(b' ')
+        if idx < 0:
+            return bytes(line).decode('ascii'), None
+        cmd = bytes(line[:idx]).decode('ascii')
+        del line[:idx + 1]
+        return cmd, line
+
+
+# BINARY framing: fixed header (command code, payload length) + raw payload
+COMMANDS = ['EVAL', 'EVAL_BLOCK', 'CALL', 'XCALL', 'EXPORT',
+            'RETURN', 'OUTPUT', 'EXCEPT', 'ERROR', 'BYE', 'SHM', 'BATCH', 'FORK',
+            'HANDLE', 'LINK', 'REDIRECT']
+CODES = dict((cmd, code) for code, cmd in enumerate(COMMANDS))
+HEADER = struct.Struct('!BQ')
+
+class BINARY(object):
+    @staticmethod
+    def send(proc, cmd, code):
+        chunks = [HEADER.pack(CODES[cmd], size(code))]
+        chunks.extend(code if isinstance(code, list) else [code])
+        if hasattr(proc, 'sendv'):
+            proc.sendv(chunks)
+        else:
+            proc.send(b''.join(chunks))
+
+    @staticmethod
+    def recv(reader):
+        # the header is consumed together with the payload, so that an
+        # incomplete message can be parsed again from the start
+        code, size = HEADER.unpack(bytes(reader.peek(HEADER.size)))
+        payload = reader.read(HEADER.size + size)
+        if code >= len(COMMANDS):
+            return None, None
+        if not size:
+            return COMMANDS[code], None
+        del payload[:HEADER.size]
+        return COMMANDS[code], payload
+
+
+# Shared memory side channel: large payloads are written to a file in a
+# memory-backed directory, and only a small JSON descriptor [cmd, name,
+# offset, length] is sent in a "SHM" message. The receiver maps the file and
+# unlinks it.
+SHM_DIR = '/dev/shm'
+SHM_PREFIX = 'bond-'
+SHM_THRESHOLD = 1 << 20
+
+class SharedMemory(object):
+    def __init__(self, path=SHM_DIR, threshold=SHM_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+
+    def dump(self, cmd, code):
+        import tempfile
+        fd, path = tempfile.mkstemp(prefix=SHM_PREFIX, dir=self.path)
+        length = size(code)
+        try:
+            os.ftruncate(fd, length)
+            buf = mmap.mmap(fd, length)
+            pos = 0
+            for chunk in (code if isinstance(code, list) else [code]):
+                buf[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+            buf.close()
+        except:
+            os.unlink(path)
+            raise
+        finally:
+            os.close(fd)
+        desc = [cmd, os.path.basename(path), 0, length]
+        return json.dumps(desc).encode('utf-8')
+
+    def load(self, code):
+        cmd, name, offset, length = json.loads(bytes(code).decode('utf-8'))
+        if os.path.basename(name) != name or not name.startswith(SHM_PREFIX):
+            raise ValueError('invalid shared memory segment "{name}"'.format(name=name))
+        path = os.path.join(self.path, name)
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+        try:
+            os.unlink(path)
+            # a private mapping, so that the payload can be decoded in place
+            # into writable objects. It's closed along with the last view
+            buf = mmap.mmap(fd, offset + length, access=mmap.ACCESS_COPY)
+            try:
+                code = memoryview(buf)[offset:offset + length]
+            except TypeError:
+                # no memoryview support for mmap on Python 2
+                code = buf[offset:offset + length]
+                buf.close()
+        finally:
+            os.close(fd)
+        return cmd, code
@@ -0,0 +1,101 @@
+# Prometheus exporter for the performance counters of all live bonds
+import threading
+
+import bond
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (name, type, help, stats key)
+METRICS = [
+    ('bond_calls_total', 'counter', 'Calls sent to the interpreter', 'calls'),
+    ('bond_evals_total', 'counter', 'Evaluations sent to the interpreter', 'evals'),
+    ('bond_sent_bytes_total', 'counter', 'Payload bytes sent', 'bytes_sent'),
+    ('bond_received_bytes_total', 'counter', 'Payload bytes received', 'bytes_received'),
+    ('bond_relayed_bytes_total', 'counter', 'Payload bytes of proxied calls relayed as-is',
+     'relayed'),
+    ('bond_dumps_seconds_total', 'counter', 'Time spent serializing', 'dumps_time'),
+    ('bond_loads_seconds_total', 'counter', 'Time spent deserializing', 'loads_time'),
+    ('bond_wait_seconds_total', 'counter', 'Time spent waiting for the interpreter', 'wait_time'),
+    ('bond_callback_depth', 'gauge', 'Exported functions currently being evaluated', 'depth'),
+    ('bond_callback_depth_max', 'gauge', 'Maximum nesting of exported functions', 'max_depth'),
+]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join('{key}="{value}"'.format(key=key, value=_escape(value))
+                          for key, value in sorted(labels.items())) + '}'
+
+
+def format_metrics(stats=None):
+    '''Return the counters in "stats" (``bond.stats()`` by default) in the
+    Prometheus text exposition format'''
+    if stats is None:
+        stats = bond.stats()
+    lines = []
+    def family(name, type, help, samples):
+        lines.append('# HELP {name} {help}'.format(name=name, help=help))
+        lines.append('# TYPE {name} {type}'.format(name=name, type=type))
+        for labels, value in samples:
+            lines.append('{name}{labels} {value!r}'.format(name=name, labels=labels,
+                                                           value=float(value)))
+
+    for name, type, help, key in METRICS:
+        family(name, type, help, [(_labels(lang=x['lang'], pid=x['pid']), x[key]) for x in stats])
+    family('bond_callback_calls_total', 'counter', 'Calls to exported functions',
+           [(_labels(lang=x['lang'], pid=x['pid'], name=name), entry['calls'])
+            for x in stats for name, entry in sorted(x['callbacks'].items())])
+    family('bond_callback_seconds_total', 'counter', 'Time spent in exported functions',
+           [(_labels(lang=x['lang'], pid=x['pid'], name=name), entry['time'])
+            for x in stats for name, entry in sorted(x['callbacks'].items())])
+    family('bond_startup_seconds', 'gauge', 'Time spent in each initialization phase',
+           [(_labels(lang=x['lang'], pid=x['pid'], phase=phase), value)
+            for x in stats for phase, value in sorted(x['startup'].items())])
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = format_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def close(self):
+        '''Stop serving and release the port'''
+        self.shutdown()
+        self.server_close()
+
+
+def serve_metrics(port=0, addr='127.0.0.1'):
+    '''Serve the counters of all live bonds in the Prometheus text format at
+    "http://addr:port/metrics" from a background thread. A free port is chosen
+    when "port" is 0. Return the ``MetricsServer``, whose "server_address"
+    holds the actual address.'''
+    server = MetricsServer((addr, port), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
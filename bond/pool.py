@@ -0,0 +1,276 @@
+# Pools of interpreters
+import collections
+import functools
+import threading
+from concurrent.futures import Executor, Future
+
+from bond import make_bond, make_bonds
+
+
+class ForkServer(object):
+    def __init__(self, lang, cmd=None, preload=None, **kwargs):
+        '''Construct a template interpreter using ``bond.make_bond(lang, cmd,
+        **kwargs)``, evaluating the "preload" block of code. New bonds are
+        then forked from the template, skipping the interpreter startup and
+        the preload entirely.
+
+        When forking is not supported by the driver or the interpreter is
+        remote, new bonds are created and preloaded from scratch instead.'''
+        self.lang = lang
+        self.cmd = cmd
+        self.preload = preload
+        self.kwargs = kwargs
+        self.template = self._make()
+        self.forking = 'FORK' in self.template._features
+
+
+    def _make(self):
+        bond = make_bond(self.lang, self.cmd, **self.kwargs)
+        if self.preload is not None:
+            bond.eval_block(self.preload)
+        return bond
+
+    def make_bond(self):
+        '''Return a new ``Bond`` with the preload block already evaluated'''
+        if self.forking:
+            return self.template.fork()
+        return self._make()
+
+    def close(self):
+        '''Terminate the template interpreter'''
+        self.template.close()
+
+
+class BondPool(object):
+    def __init__(self, lang, size=None, cmd=None, init_block=None, fork=False, **kwargs):
+        '''Construct a pool of "size" interpreters (the number of CPUs by
+        default), started concurrently using ``bond.make_bonds(lang, size, cmd,
+        **kwargs)``. "init_block" is an optional block of code evaluated by
+        each interpreter once initialized. If "fork" is true, interpreters are
+        forked from an initialized template instead (see ``ForkServer``).
+
+        Calls are dispatched to the idle interpreter which served the least
+        number of calls, or queued until one becomes idle.'''
+        if size is None:
+            import multiprocessing
+            size = multiprocessing.cpu_count()
+        self.lang = lang
+        self.cmd = cmd
+        self.init_block = init_block
+        self.kwargs = kwargs
+        self.bonds = []
+        self._forkserver = None
+        try:
+            if fork:
+                self._forkserver = ForkServer(lang, cmd, init_block, **kwargs)
+                for i in range(size):
+                    self.bonds.append(self._forkserver.make_bond())
+            else:
+                self.bonds = make_bonds(lang, size, cmd, **kwargs)
+            for bond in self.bonds:
+                self._setup(bond)
+        except:
+            BondPool.close(self)
+            raise
+
+        self._lock = threading.Lock()
+        self._idle = list(self.bonds)
+        self._calls = dict((bond, 0) for bond in self.bonds)
+        self._pending = collections.deque()
+        self._local = threading.local()
+
+
+    def _spawn(self):
+        if self._forkserver is not None:
+            bond = self._forkserver.make_bond()
+        else:
+            bond = make_bond(self.lang, self.cmd, **self.kwargs)
+        self._setup(bond)
+        return bond
+
+    def _setup(self, bond):
+        # forked bonds inherit the init block from the template
+        if self.init_block is not None and self._forkserver is None:
+            bond.eval_block(self.init_block)
+
+    def _dispatch(self):
+        # replies completing during dispatch are handled by the outer loop
+        if getattr(self._local, 'dispatching', False):
+            return
+        self._local.dispatching = True
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle or not self._pending:
+                        return
+                    bond = min(self._idle, key=self._calls.__getitem__)
+                    self._idle.remove(bond)
+                    self._calls[bond] += 1
+                    fut, name, args = self._pending.popleft()
+                if not fut.set_running_or_notify_cancel():
+                    self._release(bond)
+                    continue
+                try:
+                    ret = bond.call_async(name, *args)
+                except Exception as e:
+                    fut.set_exception(e)
+                    self._release(bond)
+                    continue
+                ret.add_done_callback(functools.partial(self._done, bond, fut))
+        finally:
+            self._local.dispatching = False
+
+    def _release(self, bond):
+        with self._lock:
+            self._idle.append(bond)
+
+    def _done(self, bond, fut, ret):
+        try:
+            fut.set_result(ret.result())
+        except Exception as e:
+            fut.set_exception(e)
+        self._release(bond)
+        self._dispatch()
+
+
+    def submit(self, name, *args):
+        '''Queue a call to the function "name" using *args, returning a
+        ``concurrent.futures.Future`` of the result'''
+        fut = Future()
+        with self._lock:
+            self._pending.append((fut, name, args))
+        self._dispatch()
+        return fut
+
+    def call(self, name, *args):
+        '''Call a function "name" using *args on the first available interpreter'''
+        return self.submit(name, *args).result()
+
+    def map(self, name, *iterables):
+        '''Call a function "name" for each set of arguments taken from
+        "iterables" (as the built-in ``map``), distributing the calls among all
+        interpreters. Return the list of results, in order.'''
+        futs = [self.submit(name, *args) for args in zip(*iterables)]
+        return [fut.result() for fut in futs]
+
+    def close(self):
+        '''Terminate all the interpreters in the pool'''
+        for bond in self.bonds:
+            bond.close()
+        if self._forkserver is not None:
+            self._forkserver.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+
+class BondExecutor(BondPool, Executor):
+    def __init__(self, lang, max_workers=None, cmd=None, setup=None,
+                 max_calls_per_worker=None, **kwargs):
+        '''A ``concurrent.futures.Executor`` running calls on a pool of
+        "max_workers" interpreters, created with ``bond.make_bond(lang, cmd,
+        **kwargs)``. "setup" is either a block of code or a function called
+        with each new ``Bond``. When "max_calls_per_worker" is given, workers
+        are replaced by a fresh interpreter after as many calls.
+
+        As with ``BondPool``, the function to be called is specified by name:
+        ``executor.submit("name", *args)``.'''
+        self.setup = setup
+        self.max_calls_per_worker = max_calls_per_worker
+        self._shutdown = False
+        self._closed = False
+        init_block = setup if not callable(setup) else None
+        BondPool.__init__(self, lang, max_workers, cmd, init_block, **kwargs)
+        self._cond = threading.Condition(self._lock)
+
+
+    def _setup(self, bond):
+        BondPool._setup(self, bond)
+        if callable(self.setup):
+            self.setup(bond)
+
+    def _release(self, bond):
+        with self._lock:
+            recycle = self.max_calls_per_worker is not None and \
+                self._calls[bond] >= self.max_calls_per_worker
+            if recycle:
+                self.bonds.remove(bond)
+                del self._calls[bond]
+            # queued calls still need a worker after shutdown
+            spawn = recycle and (not self._shutdown or bool(self._pending))
+        if recycle:
+            bond.close()
+        if spawn:
+            try:
+                bond = self._spawn()
+            except Exception as e:
+                self._abort(e)
+                self._drain()
+                return
+        with self._lock:
+            if spawn:
+                self.bonds.append(bond)
+                self._calls[bond] = 0
+            if not recycle or spawn:
+                self._idle.append(bond)
+            self._cond.notify_all()
+        self._drain()
+
+    def _abort(self, error):
+        # no worker left to run the queued calls
+        with self._lock:
+            if self.bonds:
+                return
+            pending = list(self._pending)
+            self._pending.clear()
+        for fut, name, args in pending:
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(error)
+
+    def _drain(self):
+        # close the interpreters once shut down and idle
+        with self._lock:
+            if not self._shutdown or self._closed or self._pending or \
+               len(self._idle) < len(self.bonds):
+                return
+            self._closed = True
+            self._cond.notify_all()
+        BondPool.close(self)
+
+
+    def submit(self, name, *args, **kwargs):
+        '''Queue a call to the function "name" using *args, returning a
+        ``concurrent.futures.Future`` of the result'''
+        if kwargs:
+            raise TypeError('keyword arguments are not supported')
+        if self._shutdown:
+            raise RuntimeError('cannot schedule new futures after shutdown')
+        return BondPool.submit(self, name, *args)
+
+    map = Executor.map
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        '''Stop accepting new calls and close all interpreters with
+        ``Bond.close()`` once the queued calls are done. If "wait" is true,
+        wait for this to happen. If "cancel_futures" is true, calls not
+        started yet are cancelled.'''
+        with self._lock:
+            self._shutdown = True
+            pending = []
+            if cancel_futures:
+                pending = list(self._pending)
+                self._pending.clear()
+        for fut, name, args in pending:
+            fut.cancel()
+        self._drain()
+        if wait:
+            with self._lock:
+                while not self._closed:
+                    self._cond.wait()
+
+    def close(self):
+        '''Same as ``shutdown(wait=True)``'''
+        self.shutdown()
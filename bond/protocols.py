@@ -1,3 +1,11 @@
+import codecs
+
+# Payloads can be any bytes-like object: a memoryview of a shared memory
+# segment is decoded without copying it first
+def _decode(buf):
+    return codecs.decode(buf, 'utf-8')
+
+
 # PICKLE protocol
 try:
     import cPickle as pickle
@@ -11,19 +19,125 @@ class PICKLE(object):
 
     @staticmethod
     def loads(buf):
-        dec = eval(buf.decode('utf-8'))
+        dec = eval(_decode(buf))
         if not isinstance(dec, bytes): dec = dec.encode('utf-8')
         return pickle.loads(dec)[0]
 
 
+# PICKLE5 protocol: binary pickles with out-of-band buffers (Python >= 3.8)
+#
+# The payload consists of a header (pickle length, number of out-of-band
+# buffers, each buffer length), followed by the pickle and the raw buffers.
+# This is only usable with a binary-safe framing. dumps() returns the payload
+# as a list of chunks, so that the buffers are written out without copying.
+#
+# NOTE: the pickler never calls reducer_override() for built-in types:
+#       "bytes" and "bytearray" objects are always pickled in-band, and only
+#       memoryviews and NumPy arrays are sent out-of-band.
+import io
+import struct
+import sys
+
+OOB_THRESHOLD = 65536
+PICKLE5_HEADER = struct.Struct('!QI')
+
+def _reduce_ndarray(numpy, obj):
+    # NumPy arrays are sent as (shape, dtype, strides) and a single raw block,
+    # which is rebuilt on the other side by the ndarray constructor itself
+    # without copying. Only NumPy is required on the receiving side.
+    if obj.dtype.hasobject:
+        return NotImplemented
+    if not (obj.flags.c_contiguous or obj.flags.f_contiguous):
+        obj = numpy.ascontiguousarray(obj)
+    return (numpy.ndarray, (obj.shape, obj.dtype, pickle.PickleBuffer(obj), 0, obj.strides))
+
+if pickle.HIGHEST_PROTOCOL >= 5:
+    class _Pickler(pickle.Pickler):
+        def reducer_override(self, obj):
+            if isinstance(obj, memoryview):
+                buf = pickle.PickleBuffer(obj)
+                try:
+                    buf.raw()
+                except BufferError:
+                    # non-contiguous buffers are copied
+                    buf = obj.tobytes()
+                return (bytes, (buf,))
+
+            # avoid importing NumPy: arrays can only exist if it's already loaded
+            numpy = sys.modules.get('numpy')
+            if numpy is not None and type(obj) is numpy.ndarray:
+                return _reduce_ndarray(numpy, obj)
+            return NotImplemented
+
+    def _buffer_callback(buffers):
+        # small buffers are serialized in-band
+        def callback(buf):
+            if buf.raw().nbytes < OOB_THRESHOLD:
+                return True
+            buffers.append(buf)
+        return callback
+
+    class PICKLE5(object):
+        @staticmethod
+        def dumps(*args):
+            data = io.BytesIO()
+            buffers = []
+            _Pickler(data, 5, buffer_callback=_buffer_callback(buffers)).dump(args)
+            data = data.getbuffer()
+            buffers = [buf.raw() for buf in buffers]
+            header = PICKLE5_HEADER.pack(len(data), len(buffers))
+            if buffers:
+                header += struct.pack('!{}Q'.format(len(buffers)),
+                                      *[buf.nbytes for buf in buffers])
+            return [header, data] + buffers
+
+        @staticmethod
+        def loads(buf):
+            if isinstance(buf, list):
+                buf = b''.join(buf)
+            view = memoryview(buf)
+            size, count = PICKLE5_HEADER.unpack_from(view)
+            pos = PICKLE5_HEADER.size
+            lengths = struct.unpack_from('!{}Q'.format(count), view, pos)
+            pos += 8 * count
+            data = view[pos:pos + size]
+            pos += size
+            buffers = []
+            for length in lengths:
+                buffers.append(view[pos:pos + length])
+                pos += length
+            return pickle.loads(data, buffers=buffers)[0]
+
+
 # JSON protocol
 import json
+import re
 
 class JSON(object):
     @staticmethod
     def loads(buf):
-        return json.loads(buf.decode('utf-8'))
+        return json.loads(_decode(buf))
 
     @staticmethod
     def dumps(*args):
         return json.dumps(*args, skipkeys=False).encode('utf-8')
+
+    # Calls ("[name, args]") can be relayed between JSON bonds by rewriting
+    # the function name only, leaving the encoded arguments untouched
+    _CALL = re.compile(br'\s*\[\s*("(?:[^"\\]|\\.)*")\s*,')
+
+    @staticmethod
+    def split(buf):
+        '''Return the name and the raw arguments of an encoded call'''
+        if isinstance(buf, memoryview):
+            buf = buf.tobytes()
+        m = JSON._CALL.match(buf)
+        end = buf.rindex(b']')
+        if m is None or end < m.end():
+            raise ValueError('malformed call')
+        return json.loads(bytes(m.group(1)).decode('utf-8')), buf[m.end():end]
+
+    @staticmethod
+    def join(name, args):
+        '''Encode a call to "name" using the raw arguments from split()'''
+        return b''.join([b'[', JSON.dumps(name), b', ', args, b']'])
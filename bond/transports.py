@@ -0,0 +1,185 @@
+# Transports: pexpect objects connected to the interpreter
+import errno
+import fcntl
+import os
+import pexpect
+import pexpect.fdpexpect
+import signal
+import socket
+import subprocess
+import time
+import tty
+
+
+def _writev(fd, chunks):
+    # write all the bytes-like "chunks" in order, with as few system calls as
+    # possible and without joining them
+    chunks = [memoryview(chunk) for chunk in chunks if len(chunk)]
+    while chunks:
+        if hasattr(os, 'writev'):
+            size = os.writev(fd, chunks[:1024])
+        else:
+            size = os.write(fd, chunks[0])
+        while size:
+            if size < len(chunks[0]):
+                chunks[0] = chunks[0][size:]
+                break
+            size -= len(chunks.pop(0))
+
+def _write_nonblocking(fd, buf):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    try:
+        return os.write(fd, buf)
+    except OSError as e:
+        # writing to a terminal after the child exited results in EIO
+        if e.errno == errno.EIO:
+            raise pexpect.EOF('End Of File (EOF).')
+        if e.errno != errno.EAGAIN: raise
+        return 0
+    finally:
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+
+def _setraw_stdin():
+    tty.setraw(0)
+
+class Spawn(pexpect.spawn):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('env', {})['TERM'] = 'dumb'
+        # switch the terminal to raw mode (disabling echo) before the
+        # interpreter is started, and don't delay writes
+        kwargs['echo'] = False
+        kwargs['preexec_fn'] = _setraw_stdin
+        super(Spawn, self).__init__(*args, **kwargs)
+        self.delaybeforesend = None
+
+    def sendv(self, chunks):
+        '''Write the bytes-like "chunks" in order (see ``_writev()``)'''
+        for chunk in chunks:
+            self._log(chunk, 'send')
+        _writev(self.child_fd, chunks)
+
+    def encode_line(self, s):
+        '''Return the bytes sent by sendline(s), logging them'''
+        s = self._coerce_send_string(s) + self._coerce_send_string(self.linesep)
+        self._log(s, 'send')
+        return self._encoder.encode(s, final=False)
+
+    def write_nonblocking(self, buf):
+        '''Write as much of the bytes "buf" as the terminal accepts without
+        blocking, returning the number of bytes written.'''
+        return _write_nonblocking(self.child_fd, buf)
+
+    def sendline_timeout(self, s, timeout):
+        '''Same as sendline(), raising ``pexpect.TIMEOUT`` if the terminal
+        doesn't accept all of "s" within "timeout" seconds (never if None).
+        The terminal input buffer is small, and a plain write blocks as soon
+        as it's full.'''
+        buf = self.encode_line(s)
+        deadline = None if timeout is None else time.time() + timeout
+        pos = 0
+        while pos < len(buf):
+            remaining = None if deadline is None else deadline - time.time()
+            if (remaining is not None and remaining <= 0) or \
+               not pexpect.utils.select_ignore_interrupts([], [self.child_fd], [], remaining)[1]:
+                raise pexpect.TIMEOUT('Timeout exceeded.')
+            pos += self.write_nonblocking(buf[pos:])
+        return pos
+
+
+class Pipe(pexpect.fdpexpect.fdspawn):
+    def __init__(self, command, cwd=None, env=None, timeout=30, logfile=None):
+        '''Spawn "command" with stdin/stdout connected through plain pipes
+        instead of a pseudo-terminal. stderr is merged into stdout, as it
+        would be on a terminal.'''
+        argv = pexpect.utils.split_command_line(command)
+        try:
+            self.popen = subprocess.Popen(argv, cwd=cwd, env=env, bufsize=0,
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT,
+                                          close_fds=True)
+        except OSError as e:
+            raise pexpect.ExceptionPexpect(str(e))
+        super(Pipe, self).__init__(self.popen.stdout, timeout=timeout, logfile=logfile)
+        self.write_fd = self.popen.stdin.fileno()
+        self.command = command
+        self.pid = self.popen.pid
+
+    def send(self, s):
+        s = self._coerce_send_string(s)
+        self._log(s, 'send')
+        buf = self._encoder.encode(s, final=False)
+        pos = 0
+        while pos < len(buf):
+            pos += os.write(self.write_fd, buf[pos:])
+        return pos
+
+    def sendv(self, chunks):
+        '''Write the bytes-like "chunks" in order (see ``_writev()``)'''
+        for chunk in chunks:
+            self._log(chunk, 'send')
+        _writev(self.write_fd, chunks)
+
+    def write_nonblocking(self, buf):
+        '''Write as much of the bytes "buf" as the pipe accepts without
+        blocking, returning the number of bytes written.'''
+        return _write_nonblocking(self.write_fd, buf)
+
+    def sendeof(self):
+        self.popen.stdin.close()
+
+    def isalive(self):
+        return self.popen.poll() is None
+
+    def terminate(self, force=False):
+        if self.isalive():
+            if force:
+                self.popen.kill()
+            else:
+                self.popen.terminate()
+        return not self.isalive()
+
+    def close(self):
+        if self.child_fd == -1:
+            return
+        self.popen.stdin.close()
+        self.popen.stdout.close()
+        self.child_fd = -1
+        self.closed = True
+
+
+class Socket(Pipe):
+    def __init__(self, sock, pid, timeout=30, logfile=None):
+        '''Communicate with an already running process "pid" through the
+        connected stream socket "sock"'''
+        pexpect.fdpexpect.fdspawn.__init__(self, sock.fileno(), timeout=timeout, logfile=logfile)
+        self.sock = sock
+        self.write_fd = sock.fileno()
+        self.command = None
+        self.pid = pid
+
+    def sendeof(self):
+        self.sock.shutdown(socket.SHUT_WR)
+
+    def isalive(self):
+        try:
+            os.kill(self.pid, 0)
+        except OSError:
+            return False
+        return True
+
+    def terminate(self, force=False):
+        if self.isalive():
+            os.kill(self.pid, signal.SIGKILL if force else signal.SIGTERM)
+        return not self.isalive()
+
+    def close(self):
+        if self.child_fd == -1:
+            return
+        self.sock.close()
+        self.child_fd = -1
+        self.closed = True
+
+
+TRANSPORTS = {'pty': Spawn, 'pipe': Pipe}
@@ -37,7 +37,8 @@ setup(name='python-bond', version='1.4',
       packages=find_packages(exclude=['tests']),
       include_package_data=True,
       exclude_package_data = {'': ['*.txt', '*.rst']},
+      zip_safe=False,
 
-      install_requires=['pexpect', 'setuptools'],
+      install_requires=['pexpect>=4.0', 'futures; python_version < "3"'],
       setup_requires=['nose', 'setuptools_git'],
       test_suite='nose.collector')
@@ -29,7 +29,7 @@ def bond_repl_depth(repl):
             repl.eval('1')
         except bond.TerminatedException:
             break
-        repl._proc.sendline('RETURN')
+        repl._sendstate('RETURN', repl.dumps(None))
         depth += 1
     return depth
 
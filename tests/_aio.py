@@ -0,0 +1,162 @@
+import asyncio
+import gc
+import os
+import signal
+import threading
+import time
+import bond
+from bond.aio import AsyncBond, make_bond_async
+from tests import *
+
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, TIMEOUT * 10))
+
+
+def test_async_basic():
+    async def main():
+        py = await make_bond_async('Python', timeout=TIMEOUT)
+        assert(isinstance(py, AsyncBond))
+        assert(await py.eval('1 + 1') == 2)
+        await py.eval_block('x = 42')
+        assert(await py.eval('x') == 42)
+        assert(await py.call('str', 1) == '1')
+        assert(await py.callable('len')('abc') == 3)
+        buf = 'x' * (1 << 18)
+        assert(await py.call('str', buf) == buf)
+        py.close()
+    _run(main())
+
+
+def test_async_error():
+    async def main():
+        py = await make_bond_async('Python', timeout=TIMEOUT)
+        failed = False
+        try:
+            await py.eval('undefined_variable')
+        except bond.RemoteException as e:
+            failed = True
+        assert(failed)
+        assert(await py.eval('1') == 1)
+        py.close()
+    _run(main())
+
+
+def test_async_export():
+    async def main():
+        py = await make_bond_async('Python', timeout=TIMEOUT)
+
+        def plain(x):
+            return x + 1
+
+        async def coro(x):
+            await asyncio.sleep(0.01)
+            # nested requests are allowed while the remote is waiting
+            return await py.call('plain', x) * 2
+
+        await py.export(plain)
+        await py.export(coro)
+        assert(await py.call('coro', 1) == 4)
+
+        # a failing coroutine
+        async def broken():
+            raise ValueError('broken')
+        await py.export(broken)
+        failed = False
+        try:
+            await py.call('broken')
+        except bond.RemoteException as e:
+            failed = True
+        assert(failed)
+        py.close()
+    _run(main())
+
+
+def test_async_concurrent():
+    async def main():
+        bonds = await asyncio.gather(*[make_bond_async('Python', timeout=TIMEOUT)
+                                       for i in range(3)])
+
+        # concurrent requests on the same and on different bonds
+        calls = [bonds[i % 3].call('str', i) for i in range(30)]
+        ret = await asyncio.gather(*calls)
+        assert(ret == [str(i) for i in range(30)])
+
+        # a cancelled request doesn't alter the order of replies
+        slow = asyncio.ensure_future(bonds[0].eval('__import__("time").sleep(0.2) or 1'))
+        await asyncio.sleep(0.05)
+        slow.cancel()
+        assert(await bonds[0].eval('2') == 2)
+
+        # proxy between two asynchronous bonds
+        await bonds[0].eval_block('def f(x): return x * 3')
+        await bonds[0].proxy('f', bonds[1])
+        assert(await bonds[1].call('f', 2) == 6)
+
+        for py in bonds:
+            py.close()
+    _run(main())
+
+
+def test_async_nonblocking():
+    async def main():
+        ticks = []
+        async def ticker():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        task = asyncio.ensure_future(ticker())
+        py = await make_bond_async('Python', timeout=TIMEOUT, shm=0)
+        assert(len(ticks) > 1)
+
+        # the loop keeps running while a payload larger than the terminal
+        # buffer waits for a stopped interpreter
+        pid = py._proc.pid
+        os.kill(pid, signal.SIGSTOP)
+        resume = threading.Timer(TIMEOUT, os.kill, (pid, signal.SIGCONT))
+        resume.start()
+        try:
+            buf = 'x' * (1 << 20)
+            ret = asyncio.ensure_future(py.call('len', buf))
+            start = time.time()
+            await asyncio.sleep(0.1)
+            del ticks[:]
+            await asyncio.sleep(0.1)
+            assert(len(ticks) > 1)
+            assert(time.time() - start < TIMEOUT / 2)
+        finally:
+            os.kill(pid, signal.SIGCONT)
+            resume.cancel()
+        assert(await ret == len(buf))
+
+        task.cancel()
+        py.close()
+    _run(main())
+
+
+def test_async_slots():
+    async def main():
+        py = await make_bond_async('Python', timeout=TIMEOUT)
+        await py.eval_block('x = 1')
+
+        # references can be passed as arguments
+        ref = py.ref('x + 1')
+        assert(await py.call('str', ref) == '2')
+        assert(await py.call('str', ref) == '2')
+
+        # handles are kept by the interpreter
+        ret = await py.call('list', 'abc', by_ref=True)
+        assert(isinstance(ret, bond.RemoteHandle))
+        if ret.id is not None:
+            assert(await ret[1] == 'b')
+            assert(await ret.fetch() == ['a', 'b', 'c'])
+        assert(await py.call('len', ret) == 3)
+
+        # and released with the next request once dropped
+        if 'HANDLE' in py._features and 'REF' in py._features:
+            del ref, ret
+            gc.collect()
+            assert(await py.eval('len(__BOND_HANDLES) + len(__BOND_REFS)') == 0)
+        py.close()
+    _run(main())
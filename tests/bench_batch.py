@@ -0,0 +1,36 @@
+from __future__ import print_function
+import bond
+import sys
+import time
+
+# Cost per invocation of calling the same function over many inputs: one call
+# at a time, with call_many() when batches are supported by the driver, and
+# with call_many() falling back to pipelined calls. Run with
+# "python -m tests.bench_batch [cmd]".
+
+CALLS = 20000
+
+
+def bench_batch(b, mode, calls=CALLS):
+    args = [(i,) for i in range(calls)]
+    start = time.time()
+    if mode == 'sequential':
+        ret = [b.call('str', *x) for x in args]
+    else:
+        ret = b.call_many('str', args)
+    secs = time.time() - start
+    assert(ret == [str(i) for i in range(calls)])
+    return secs / calls
+
+
+if __name__ == '__main__':
+    cmd = sys.argv[1] if len(sys.argv) > 1 else None
+    b = bond.make_bond('Python', cmd)
+    modes = ['sequential', 'batch', 'pipelined']
+    if 'BATCH' not in b._features:
+        modes.remove('batch')
+    for mode in modes:
+        if mode == 'pipelined':
+            b._features = frozenset()
+        latency = bench_batch(b, mode)
+        print("{mode}: {us:.1f} us/call".format(mode=mode, us=latency * 1e6))
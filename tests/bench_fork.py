@@ -0,0 +1,41 @@
+from __future__ import print_function
+import bond
+import sys
+import time
+
+# Time to get a new, preloaded bond: from scratch with make_bond(), or forked
+# from a template by a ForkServer. Run with "python -m tests.bench_fork [lang]".
+
+BONDS = 20
+PRELOAD = {'Python': 'import json, decimal, email.mime.text, xml.dom.minidom'}
+
+
+def bench_fork(lang, fork, count=BONDS):
+    preload = PRELOAD.get(lang)
+    server = bond.ForkServer(lang, preload=preload)
+    if fork and not server.forking:
+        return None
+    start = time.time()
+    for i in range(count):
+        if fork:
+            b = server.make_bond()
+        else:
+            b = bond.make_bond(lang)
+            if preload is not None:
+                b.eval_block(preload)
+        b.eval('1')
+        b.close()
+    secs = time.time() - start
+    server.close()
+    return secs / count
+
+
+if __name__ == '__main__':
+    lang = sys.argv[1] if len(sys.argv) > 1 else 'Python'
+    for fork in [False, True]:
+        secs = bench_fork(lang, fork)
+        mode = 'fork' if fork else 'make_bond'
+        if secs is None:
+            print("{lang} {mode}: not supported".format(lang=lang, mode=mode))
+        else:
+            print("{lang} {mode}: {ms:.1f} ms/bond".format(lang=lang, mode=mode, ms=secs * 1e3))
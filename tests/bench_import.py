@@ -0,0 +1,41 @@
+from __future__ import print_function
+import subprocess
+import sys
+
+# Time needed by "import bond" in a fresh interpreter, as reported by
+# "python -X importtime", along with the slowest modules it pulls in.
+# Run with "python -m tests.bench_import".
+
+RUNS = 10
+TOP = 10
+
+
+def import_times(module='bond'):
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+    out = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_import(module='bond', runs=RUNS):
+    # the first run also writes the bytecode
+    import_times(module)
+    best = None
+    for i in range(runs):
+        times = import_times(module)
+        if best is None or times[module] < best[module]:
+            best = times
+    return best
+
+
+if __name__ == '__main__':
+    times = bench_import()
+    print("import bond: {ms:.1f}ms".format(ms=times['bond'] / 1e3))
+    top = sorted(times.items(), key=lambda x: x[1], reverse=True)
+    for name, us in top[1:TOP + 1]:
+        print("  {name}: {ms:.1f}ms".format(name=name, ms=us / 1e3))
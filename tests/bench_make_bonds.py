@@ -0,0 +1,44 @@
+from __future__ import print_function
+import bond
+import sys
+import time
+
+# Time needed to create several bonds with make_bond() in a loop, compared to
+# make_bonds(). An optional startup latency (in seconds) can be simulated to
+# approximate remote interpreters. Run with
+# "python -m tests.bench_make_bonds [lang] [count] [latency]".
+
+COUNT = 8
+
+
+def bench_loop(lang, count=COUNT, cmd=None):
+    start = time.time()
+    bonds = [bond.make_bond(lang, cmd) for i in range(count)]
+    secs = time.time() - start
+    for b in bonds:
+        b.close()
+    return secs
+
+
+def bench_make_bonds(lang, count=COUNT, cmd=None):
+    start = time.time()
+    bonds = bond.make_bonds(lang, count, cmd)
+    secs = time.time() - start
+    for b in bonds:
+        b.close()
+    return secs
+
+
+if __name__ == '__main__':
+    lang = sys.argv[1] if len(sys.argv) > 1 else 'Python'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else COUNT
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    cmd = None
+    if latency:
+        # delay the default interpreter command
+        interp = bond.query_driver(lang)['command'][0][0]
+        cmd = "sh -c 'sleep {latency}; exec {interp} \"$@\"' sh".format(
+            latency=latency, interp=interp)
+    for name, bench in [('make_bond', bench_loop), ('make_bonds', bench_make_bonds)]:
+        secs = bench(lang, count, cmd)
+        print("{name}: {count} bonds in {ms:.1f}ms".format(name=name, count=count, ms=secs * 1e3))
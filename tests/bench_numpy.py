@@ -0,0 +1,34 @@
+from __future__ import print_function
+import bond
+import numpy
+import sys
+import time
+
+# Round trip of NumPy arrays through the native array codec (PICKLE5), the
+# text-based PICKLE protocol and plain JSON lists. Run with
+# "python -m tests.bench_numpy".
+
+SIZES = [10 ** n for n in range(3, 8)]
+
+
+def bench_numpy(b, size):
+    arr = numpy.random.random(size)
+    start = time.time()
+    if b._proto is bond.protocols.JSON:
+        ret = numpy.array(b.call('lambda x: x', arr.tolist()))
+    else:
+        ret = b.call('lambda x: x', arr)
+    secs = time.time() - start
+    assert((ret == arr).all())
+    return secs
+
+
+if __name__ == '__main__':
+    for protocol in bond.PROTO:
+        b = bond.make_bond('Python', protocol=protocol, timeout=None)
+        b.eval_block('import numpy')
+        for size in SIZES:
+            secs = bench_numpy(b, size)
+            print("{proto:>7} {size:>10} float64: {secs:8.4f} s, {rate:8.1f} MB/s".format(
+                proto=protocol, size=size, secs=secs, rate=size * 8 / secs / 2 ** 20))
+        b.close()
@@ -0,0 +1,32 @@
+from __future__ import print_function
+import bond
+import sys
+import time
+
+# Sequential calls versus pipelined calls with call_async(). The difference is
+# dominated by the round-trip time: run with "python -m tests.bench_pipeline
+# [cmd]", for example using "ssh remote python" as a command.
+
+CALLS = 2000
+
+
+def bench_pipeline(b, pipelined, calls=CALLS):
+    start = time.time()
+    if pipelined:
+        futs = [b.call_async('str', i) for i in range(calls)]
+        ret = [fut.result() for fut in futs]
+    else:
+        ret = [b.call('str', i) for i in range(calls)]
+    secs = time.time() - start
+    assert(ret == [str(i) for i in range(calls)])
+    return secs / calls
+
+
+if __name__ == '__main__':
+    cmd = sys.argv[1] if len(sys.argv) > 1 else None
+    b = bond.make_bond('Python', cmd)
+    for pipelined in [False, True]:
+        latency = bench_pipeline(b, pipelined)
+        print("{mode}: {us:.1f} us/call".format(
+            mode=('pipelined' if pipelined else 'sequential'),
+            us=latency * 1e6))
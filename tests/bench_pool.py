@@ -0,0 +1,33 @@
+from __future__ import print_function
+import bond
+import multiprocessing
+import sys
+import time
+
+# Throughput of a CPU-bound remote function with a single bond versus a
+# BondPool of increasing size. Run with "python -m tests.bench_pool [lang]".
+
+CALLS = 64
+CODE = {'Python': 'def work(n):\n  return sum(i * i for i in range(n))',
+        'JavaScript': 'function work(n) { var s = 0; '
+                      'for(var i = 0; i < n; ++i) s += i * i; return s; }',
+        'PHP': 'function work($n) { $s = 0; '
+               'for($i = 0; $i < $n; ++$i) $s += $i * $i; return $s; }',
+        'Perl': 'sub work { my $s = 0; $s += $_ * $_ for 0..$_[0]-1; $s }'}
+N = 200000
+
+
+def bench_pool(lang, size, calls=CALLS):
+    with bond.BondPool(lang, size, init_block=CODE[lang]) as pool:
+        start = time.time()
+        pool.map('work', [N] * calls)
+        return calls / (time.time() - start)
+
+
+if __name__ == '__main__':
+    lang = sys.argv[1] if len(sys.argv) > 1 else 'Python'
+    size = 1
+    while size <= multiprocessing.cpu_count():
+        print("{lang} x{size}: {rate:.1f} calls/s".format(
+            lang=lang, size=size, rate=bench_pool(lang, size)))
+        size *= 2
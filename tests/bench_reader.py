@@ -0,0 +1,45 @@
+from __future__ import print_function
+import bond
+import resource
+import sys
+import time
+
+# Host-side cost of receiving large return values, from 1 KB up to 256 MB.
+# The legacy pexpect buffer scan is measured as well for comparison (up to
+# LEGACY_MAX, as it doesn't scale). Run with "python -m tests.bench_reader".
+
+SIZES = [2 ** n for n in range(10, 29, 2)]
+LEGACY_MAX = 2 ** 24
+
+
+def _recv_legacy(b):
+    b._proc.expect_exact(b'\n', timeout=None)
+    return b.loads(b._proc.before.split(b' ', 1)[1])
+
+
+def bench_reader(b, size, legacy=False):
+    fut = b._request('EVAL', b.dumps("'x' * {size}".format(size=size)))
+    start = time.time()
+    ret = _recv_legacy(b) if legacy else b._wait(fut)
+    secs = time.time() - start
+    assert(len(ret) == size)
+    return secs
+
+
+def _maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+if __name__ == '__main__':
+    lang = sys.argv[1] if len(sys.argv) > 1 else 'Python'
+    b = bond.make_bond(lang, protocol='JSON', framing='LINE', timeout=None)
+    for legacy in [True, False]:
+        name = 'pexpect' if legacy else 'reader'
+        for size in SIZES:
+            if legacy and size > LEGACY_MAX:
+                break
+            secs = bench_reader(b, size, legacy)
+            print("{name} {size:>10} bytes: {secs:8.4f} s, {rate:8.1f} MB/s, "
+                  "maxrss {rss:.1f} MB".format(name=name, size=size, secs=secs,
+                                               rate=size / secs / 2 ** 20, rss=_maxrss_mb()))
+    b.close()
@@ -0,0 +1,34 @@
+from __future__ import print_function
+import bond
+import sys
+
+# Time spent by make_bond() in each phase of the initialization (spawn, probe,
+# stage1 and stage2), averaged over a few runs, for each driver.
+# Run with "python -m tests.bench_startup [lang...]".
+
+RUNS = 10
+PHASES = ['spawn', 'probe', 'stage1', 'stage2']
+
+
+def bench_startup(lang, runs=RUNS, **kwargs):
+    totals = dict((phase, 0.) for phase in PHASES)
+    for i in range(runs):
+        b = bond.make_bond(lang, **kwargs)
+        for phase in PHASES:
+            totals[phase] += b.startup[phase]
+        b.close()
+    return dict((phase, totals[phase] / runs) for phase in PHASES)
+
+
+if __name__ == '__main__':
+    langs = sys.argv[1:] or bond.list_drivers()
+    for lang in sorted(langs):
+        for transport in sorted(bond.TRANSPORTS):
+            try:
+                times = bench_startup(lang, transport=transport)
+            except bond.BondException as e:
+                print("{lang} {transport}: {error}".format(lang=lang, transport=transport, error=e))
+                continue
+            print("{lang} {transport}: ".format(lang=lang, transport=transport) +
+                  ", ".join("{phase} {ms:.1f}ms".format(phase=phase, ms=times[phase] * 1e3)
+                            for phase in PHASES))
@@ -0,0 +1,25 @@
+from __future__ import print_function
+import bond
+import sys
+import timeit
+
+# Round-trip latency of tiny calls, which is dominated by the per-message
+# overhead of the transport. Run with "python -m tests.bench_transport [lang]".
+
+CALLS = 2000
+
+
+def bench_transport(lang, transport, calls=CALLS):
+    b = bond.make_bond(lang, transport=transport)
+    b.eval('1')
+    secs = timeit.timeit(lambda: b.eval('1'), number=calls)
+    b.close()
+    return secs / calls
+
+
+if __name__ == '__main__':
+    lang = sys.argv[1] if len(sys.argv) > 1 else 'Python'
+    for transport in sorted(bond.TRANSPORTS):
+        latency = bench_transport(lang, transport)
+        print("{lang} {transport}: {us:.1f} us/call".format(
+            lang=lang, transport=transport, us=latency * 1e6))
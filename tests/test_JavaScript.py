@@ -1,4 +1,8 @@
 from __future__ import print_function
+import gc
+import os
+import shutil
+import tempfile
 import bond
 from tests import *
 
@@ -439,6 +443,35 @@ def test_output_redirect():
     assert(str(ret) == "Hello world!\n")
 
 
+def test_output_file():
+    capture = OutputCapture()
+    path = tempfile.mkdtemp()
+    try:
+        with capture:
+            js = bond.make_bond('JavaScript', timeout=TIMEOUT)
+            assert('REDIRECT' in js._features)
+
+            # channels written to a file, or discarded
+            js.redirect('STDOUT', os.path.join(path, 'out'))
+            js.redirect('STDERR', os.devnull)
+            js.eval_block(r'console.log("Hello world!");')
+            js.eval_block(r'console.error("Hello world!");')
+            with open(os.path.join(path, 'out')) as fd:
+                assert(fd.read() == "Hello world!\n")
+
+            # and back
+            js.redirect('STDOUT')
+            js.eval_block(r'console.log("Hello again!");')
+            assert(js.eval('1') == 1)
+        assert("Hello again!\n" in str(capture.stdout))
+        assert("Hello world!\n" not in str(capture.stdout))
+        assert(str(capture.stderr) == "")
+        with open(os.path.join(path, 'out')) as fd:
+            assert(fd.read() == "Hello world!\n")
+    finally:
+        shutil.rmtree(path)
+
+
 def test_trans_except():
     js_trans = bond.make_bond('JavaScript', timeout=TIMEOUT, trans_except=True)
     js_not_trans = bond.make_bond('JavaScript', timeout=TIMEOUT, trans_except=False)
@@ -603,3 +636,74 @@ def test_ref_call():
     js.eval_block(r'var func = function() {};')
     ret = js.call('istype', js.ref('func'), 'function')
     assert(ret == True)
+
+
+def test_ref_reuse():
+    js = bond.make_bond('JavaScript', timeout=TIMEOUT)
+    assert('REF' in js._features)
+    js.eval_block('var x = 1;')
+
+    # references are evaluated again on each call
+    ref = js.ref('x + 1')
+    assert(js.call('String', ref) == '2')
+    js.eval_block('x = 2;')
+    assert(js.call('String', ref) == '3')
+
+    # errors are raised on each use
+    bad = js.ref('x +')
+    for i in range(2):
+        failed = False
+        try:
+            js.call('String', bad)
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+    # the code is only sent until registered, then released
+    assert(js._xarg(ref) == [3, ref._slot])
+    assert(js.eval('Object.keys(__BOND_REFS).length') == 2)
+    del ref, bad
+    gc.collect()
+    assert(js.eval('Object.keys(__BOND_REFS).length') == 0)
+
+
+def test_call_by_ref():
+    js = bond.make_bond('JavaScript', timeout=TIMEOUT)
+    assert('HANDLE' in js._features)
+    js.eval_block('function make_list(n) { var ret = []; '
+                  'for(var i = 0; i != n; ++i) ret.push(i); return ret; }')
+
+    # handles can be passed back as arguments, fetched or indexed
+    ret = js.call('make_list', 100, by_ref=True)
+    assert(isinstance(ret, bond.RemoteHandle))
+    assert(ret.id is not None)
+    assert(ret[42] == 42)
+    assert(js.call('function(x) { return x.length; }', ret) == 100)
+    assert(js.call('function(x, y) { return x[y]; }', ret, 7) == 7)
+    assert(ret.fetch() == list(range(100)))
+
+    # remote values are released along with the local handle
+    del ret
+    gc.collect()
+    assert(js.eval('Object.keys(__BOND_HANDLES).length') == 0)
+
+
+def test_call_many():
+    js = bond.make_bond('JavaScript', timeout=TIMEOUT)
+    assert('BATCH' in js._features)
+
+    # results are returned in order, across multiple chunks
+    ret = js.call_many('String', [(i,) for i in range(25)], chunksize=10)
+    assert(ret == [str(i) for i in range(25)])
+    assert(js.call_many('Math.max', [(1, 2), (3,)]) == [2, 3])
+
+    # failing calls don't abort the batch
+    js.eval_block('function check(x) { if(x < 0) throw new Error("negative"); return 1; }')
+    ret = js.call_many('check', [(1,), (-1,), (2,)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.RemoteException))
+    assert(ret[2] == 1)
+    ret = js.call_many('function(x) { return x? function() {}: 1; }', [(0,), (1,)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.SerializationException))
@@ -1,4 +1,9 @@
 from __future__ import print_function
+import gc
+import os
+import shutil
+import tempfile
+import time
 import bond
 from tests import *
 
@@ -437,6 +442,35 @@ def test_output_redirect():
     assert(str(ret).find("Hello world!") < 0)
 
 
+def test_output_file():
+    capture = OutputCapture()
+    path = tempfile.mkdtemp()
+    try:
+        with capture:
+            php = bond.make_bond('PHP', timeout=TIMEOUT)
+            assert('REDIRECT' in php._features)
+
+            # channels written to a file, or discarded
+            php.redirect('STDOUT', os.path.join(path, 'out'))
+            php.redirect('STDERR', os.devnull)
+            php.eval_block(r'echo "Hello world!\n";')
+            php.eval_block(r'fwrite(STDERR, "Hello world!\n");')
+            with open(os.path.join(path, 'out')) as fd:
+                assert(fd.read() == "Hello world!\n")
+
+            # and back
+            php.redirect('STDOUT')
+            php.eval_block(r'echo "Hello again!\n";')
+            assert(php.eval('1') == 1)
+        assert("Hello again!\n" in str(capture.stdout))
+        assert("Hello world!\n" not in str(capture.stdout))
+        assert(str(capture.stderr) == "")
+        with open(os.path.join(path, 'out')) as fd:
+            assert(fd.read() == "Hello world!\n")
+    finally:
+        shutil.rmtree(path)
+
+
 def test_BOND_error_reporting():
     php = bond.make_bond('PHP', timeout=TIMEOUT)
 
@@ -657,3 +691,122 @@ def test_ref_call():
     php.eval_block(r'$func = function() {};')
     ret = php.call('is_callable', php.ref('$func'))
     assert(ret == True)
+
+
+def test_ref_reuse():
+    php = bond.make_bond('PHP', timeout=TIMEOUT)
+    assert('REF' in php._features)
+    php.eval_block('$x = 1;')
+
+    # references are evaluated again on each call
+    ref = php.ref('$x + 1')
+    assert(php.call('strval', ref) == '2')
+    php.eval_block('$x = 2;')
+    assert(php.call('strval', ref) == '3')
+
+    # errors are raised on each use
+    bad = php.ref('$x +')
+    for i in range(2):
+        failed = False
+        try:
+            php.call('strval', bad)
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+    # the code is only sent until registered, then released
+    assert(php._xarg(ref) == [3, ref._slot])
+    assert(php.eval('count($__BOND_REFS)') == 2)
+    del ref, bad
+    gc.collect()
+    assert(php.eval('count($__BOND_REFS)') == 0)
+
+
+def test_call_by_ref():
+    php = bond.make_bond('PHP', timeout=TIMEOUT)
+    assert('HANDLE' in php._features)
+
+    # handles can be passed back as arguments, fetched or indexed
+    ret = php.call('range', 0, 99, by_ref=True)
+    assert(isinstance(ret, bond.RemoteHandle))
+    assert(ret.id is not None)
+    assert(ret[42] == 42)
+    assert(php.call('count', ret) == 100)
+    assert(php.call('array_sum', ret) == 4950)
+    assert(ret.fetch() == list(range(100)))
+
+    # remote values are released along with the local handle
+    del ret
+    gc.collect()
+    assert(php.eval('count($__BOND_HANDLES)') == 0)
+
+
+def test_interrupt():
+    php = bond.make_bond('PHP', timeout=TIMEOUT)
+    if 'INTERRUPT' not in php._features:
+        raise nose.plugins.skip.SkipTest("pcntl_async_signals is not available")
+
+    # slow calls are interrupted
+    fut = php.call_async('sleep', 10)
+    time.sleep(0.1)
+    php.interrupt()
+    failed = False
+    try:
+        fut.result()
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    # idle interpreters are not affected
+    php.interrupt()
+    assert(php.eval('1') == 1)
+    assert(bond_repl_depth(php) == 1)
+
+
+def test_call_many():
+    php = bond.make_bond('PHP', timeout=TIMEOUT)
+    assert('BATCH' in php._features)
+
+    # results are returned in order, across multiple chunks
+    ret = php.call_many('strval', [(i,) for i in range(25)], chunksize=10)
+    assert(ret == [str(i) for i in range(25)])
+    assert(php.call_many('sprintf', [('%s-%s', 1, 2), ('%s', 3)]) == ['1-2', '3'])
+
+    # failing calls don't abort the batch
+    php.eval_block(r'function check($x) { if($x < 0) throw new Exception("negative"); return 1; }')
+    ret = php.call_many('check', [(1,), (-1,), (2,)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.RemoteException))
+    assert(ret[2] == 1)
+    ret = php.call_many('fopen', [('php://memory', 'r')])
+    assert(isinstance(ret[0], bond.SerializationException))
+
+
+def test_fork():
+    php = bond.make_bond('PHP', timeout=TIMEOUT)
+    if 'FORK' not in php._features:
+        raise nose.plugins.skip.SkipTest("pcntl is not available")
+
+    # the child starts with a copy of the current state
+    php.eval_block('$x = 42;')
+    child = php.fork()
+    assert(child.eval('$x') == 42)
+    assert(child.eval('getmypid()') != php.eval('getmypid()'))
+    child.eval_block('$x = 1;')
+    assert(php.eval('$x') == 42)
+    assert(child.eval('$x') == 1)
+
+    # both can call us back
+    php.export(lambda x: x + 1, 'local_add')
+    child2 = php.fork()
+    assert(child2.call('local_add', 1) == 2)
+    assert(php.call('local_add', 2) == 3)
+    child.close()
+    child2.close()
+
+    # the template's own children can still be waited for
+    php.eval_block('exec("exit 3", $out, $status);')
+    assert(php.eval('$status') == 3)
+    assert(php.eval('$x') == 42)
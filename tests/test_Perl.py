@@ -1,4 +1,9 @@
 from __future__ import print_function
+import gc
+import os
+import shutil
+import tempfile
+import time
 import bond
 from tests import *
 
@@ -450,6 +455,35 @@ def test_output_redirect():
     assert(str(ret).find('$warning_expected_on_stderr') >= 0)
 
 
+def test_output_file():
+    capture = OutputCapture()
+    path = tempfile.mkdtemp()
+    try:
+        with capture:
+            pl = bond.make_bond('Perl', timeout=TIMEOUT)
+            assert('REDIRECT' in pl._features)
+
+            # channels written to a file, or discarded
+            pl.redirect('STDOUT', os.path.join(path, 'out'))
+            pl.redirect('STDERR', os.devnull)
+            pl.eval_block(r'print "Hello world!\n";')
+            pl.eval_block(r'print STDERR "Hello world!\n";')
+            with open(os.path.join(path, 'out')) as fd:
+                assert(fd.read() == "Hello world!\n")
+
+            # and back
+            pl.redirect('STDOUT')
+            pl.eval_block(r'print "Hello again!\n";')
+            assert(pl.eval('1') == 1)
+        assert("Hello again!\n" in str(capture.stdout))
+        assert("Hello world!\n" not in str(capture.stdout))
+        assert(str(capture.stderr) == "")
+        with open(os.path.join(path, 'out')) as fd:
+            assert(fd.read() == "Hello world!\n")
+    finally:
+        shutil.rmtree(path)
+
+
 def test_trans_except():
     perl_trans = bond.make_bond('Perl', timeout=TIMEOUT, trans_except=True)
     perl_not_trans = bond.make_bond('Perl', timeout=TIMEOUT, trans_except=False)
@@ -604,3 +638,122 @@ def test_ref_call():
     pl.eval_block(r'our $func = sub {};')
     ret = pl.call('ref', pl.ref('$func'))
     assert(ret == 'CODE')
+
+
+def test_ref_reuse():
+    pl = bond.make_bond('Perl', timeout=TIMEOUT)
+    assert('REF' in pl._features)
+    pl.eval_block('our $x = 1;')
+
+    # references are evaluated again on each call
+    ref = pl.ref('$x + 1')
+    assert(pl.call('&{ sub { "" . shift() } }', ref) == '2')
+    pl.eval_block('$x = 2;')
+    assert(pl.call('&{ sub { "" . shift() } }', ref) == '3')
+
+    # errors are raised on each use
+    bad = pl.ref('$x +')
+    for i in range(2):
+        failed = False
+        try:
+            pl.call('&{ sub { "" . shift() } }', bad)
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+    # the code is only sent until registered, then released
+    assert(pl._xarg(ref) == [3, ref._slot])
+    assert(pl.eval('scalar(keys(%__BOND_REFS))') == 2)
+    del ref, bad
+    gc.collect()
+    assert(pl.eval('scalar(keys(%__BOND_REFS))') == 0)
+
+
+def test_call_by_ref():
+    pl = bond.make_bond('Perl', timeout=TIMEOUT)
+    assert('HANDLE' in pl._features)
+    pl.eval_block('sub make_list { return [0..(shift() - 1)] }')
+    pl.eval_block('sub list_len { return scalar(@{shift()}) }')
+
+    # handles can be passed back as arguments, fetched or indexed
+    ret = pl.call('make_list', 100, by_ref=True)
+    assert(isinstance(ret, bond.RemoteHandle))
+    assert(ret.id is not None)
+    assert(ret[42] == 42)
+    assert(pl.call('list_len', ret) == 100)
+    assert(pl.call('&{ sub { $_[0][$_[1]] } }', ret, 7) == 7)
+    assert(ret.fetch() == list(range(100)))
+
+    # remote values are released along with the local handle
+    del ret
+    gc.collect()
+    assert(pl.eval('scalar(keys(%__BOND_HANDLES))') == 0)
+
+
+def test_interrupt():
+    pl = bond.make_bond('Perl', timeout=TIMEOUT)
+    assert('INTERRUPT' in pl._features)
+
+    # slow calls are interrupted
+    fut = pl.call_async('sleep', 10)
+    time.sleep(0.1)
+    pl.interrupt()
+    failed = False
+    try:
+        fut.result()
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    # idle interpreters are not affected
+    pl.interrupt()
+    assert(pl.eval('1') == 1)
+    assert(bond_repl_depth(pl) == 1)
+
+
+def test_call_many():
+    pl = bond.make_bond('Perl', timeout=TIMEOUT)
+    assert('BATCH' in pl._features)
+
+    # results are returned in order, across multiple chunks
+    ret = pl.call_many('&{ sub { shift() * 2 } }', [(i,) for i in range(25)], chunksize=10)
+    assert(ret == [i * 2 for i in range(25)])
+    assert(pl.call_many('sprintf', [('%s-%s', 1, 2), ('%s', 3)]) == ['1-2', '3'])
+
+    # failing calls don't abort the batch
+    pl.eval_block('sub check { die "negative\\n" if shift() < 0; 1 }')
+    ret = pl.call_many('check', [(1,), (-1,), (2,)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.RemoteException))
+    assert(ret[2] == 1)
+    ret = pl.call_many('&{ sub { shift()? sub {}: 1 } }', [(0,), (1,)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.SerializationException))
+
+
+def test_fork():
+    pl = bond.make_bond('Perl', timeout=TIMEOUT)
+    assert('FORK' in pl._features)
+
+    # the child starts with a copy of the current state
+    pl.eval_block('our $x = 42;')
+    child = pl.fork()
+    assert(child.eval('$x') == 42)
+    assert(child.eval('$$') != pl.eval('$$'))
+    child.eval_block('$x = 1;')
+    assert(pl.eval('$x') == 42)
+    assert(child.eval('$x') == 1)
+
+    # both can call us back
+    pl.export(lambda x: x + 1, 'local_add')
+    child2 = pl.fork()
+    assert(child2.call('local_add', 1) == 2)
+    assert(pl.call('local_add', 2) == 3)
+    child.close()
+    child2.close()
+
+    # the template's own children can still be waited for
+    assert(pl.eval('system("sh", "-c", "exit 3") >> 8') == 3)
+    assert(pl.eval('$x') == 42)
@@ -1,5 +1,10 @@
 from __future__ import print_function
 import bond
+import gc
+import os
+import shutil
+import tempfile
+import time
 from tests import *
 
 def test_basic():
@@ -12,6 +17,24 @@ def test_basic_rmt():
     py.close()
 
 
+def test_basic_pipe():
+    py = bond.make_bond('Python', transport='pipe', timeout=TIMEOUT)
+    assert(py.eval('1') == 1)
+    py.close()
+
+
+def test_startup():
+    for transport in ['pty', 'pipe']:
+        start = time.time()
+        py = bond.make_bond('Python', transport=transport, timeout=TIMEOUT)
+        elapsed = time.time() - start
+        phases = [py.startup[phase] for phase in ['spawn', 'probe', 'stage1', 'stage2']]
+        assert(all(phase >= 0 for phase in phases))
+        assert(sum(phases) <= elapsed)
+        assert(py.eval('1') == 1)
+        py.close()
+
+
 def _test_call_marshalling(py):
     py.eval_block(r'''def test_str():
         return "Hello world!"
@@ -64,6 +87,14 @@ def test_call_marshalling_baseline():
     py = bond.make_bond('Python', protocol='JSON', timeout=TIMEOUT)
     _test_call_marshalling(py)
 
+def test_call_marshalling_pickle():
+    py = bond.make_bond('Python', protocol='PICKLE', timeout=TIMEOUT)
+    _test_call_marshalling(py)
+
+def test_call_marshalling_pipe():
+    py = bond.make_bond('Python', transport='pipe', timeout=TIMEOUT)
+    _test_call_marshalling(py)
+
 
 def test_call_simple():
     py = bond.make_bond('Python', timeout=TIMEOUT)
@@ -128,6 +159,40 @@ def test_call_error():
     assert(py.eval('1') == 1)
 
 
+def test_call_timeout():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.eval_block('import time')
+    assert(py.call('str', 1, timeout=TIMEOUT) == '1')
+
+    # slow calls are interrupted when supported, or their reply is discarded
+    failed = False
+    try:
+        py.call('time.sleep', 1, timeout=0.1)
+    except bond.CallTimeout as e:
+        print(e)
+        failed = True
+    assert(failed)
+    assert(py.call('str', 2) == '2')
+
+    if 'INTERRUPT' in py._features:
+        fut = py.call_async('time.sleep', 10)
+        time.sleep(0.1)
+        py.interrupt()
+        failed = False
+        try:
+            fut.result()
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+        # idle interpreters are not affected
+        py.interrupt()
+        assert(py.call('str', 3) == '3')
+
+    assert(bond_repl_depth(py) == 1)
+
+
 def test_eval():
     py = bond.make_bond('Python', timeout=TIMEOUT)
     assert(py.eval('None') is None)
@@ -453,6 +518,35 @@ def test_output_redirect():
     assert(str(ret) == "Hello world!\n")
 
 
+def test_output_file():
+    capture = OutputCapture()
+    path = tempfile.mkdtemp()
+    try:
+        with capture:
+            py = bond.make_bond('Python', timeout=TIMEOUT)
+            py.eval_block(r'import sys')
+
+            # channels written to a file, or discarded
+            py.redirect('STDOUT', os.path.join(path, 'out'))
+            py.redirect('STDERR', os.devnull)
+            py.eval_block(r'sys.stdout.write("Hello world!\n")')
+            py.eval_block(r'sys.stderr.write("Hello world!\n")')
+            with open(os.path.join(path, 'out')) as fd:
+                assert(fd.read() == "Hello world!\n")
+
+            # and back
+            py.redirect('STDOUT')
+            py.eval_block(r'sys.stdout.write("Hello again!\n")')
+            assert(py.eval('1') == 1)
+        assert("Hello again!\n" in str(capture.stdout))
+        assert("Hello world!\n" not in str(capture.stdout))
+        assert(str(capture.stderr) == "")
+        with open(os.path.join(path, 'out')) as fd:
+            assert(fd.read() == "Hello world!\n")
+    finally:
+        shutil.rmtree(path)
+
+
 def test_trans_except():
     py_trans = bond.make_bond('Python', timeout=TIMEOUT, trans_except=True)
     py_not_trans = bond.make_bond('Python', timeout=TIMEOUT, trans_except=False)
@@ -579,6 +673,52 @@ def test_buf_size_rmt():
     py = bond.make_bond('Python', "ssh localhost python", timeout=TIMEOUT)
     _test_buf_size(py)
 
+def test_buf_size_pipe():
+    py = bond.make_bond('Python', transport='pipe', timeout=TIMEOUT)
+    _test_buf_size(py)
+
+
+def test_buf_binary():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    for size in [0, 1, 2 ** 10, 2 ** 20]:
+        buf = bytearray(os.urandom(size))
+        assert(py.call('bytearray', buf) == buf)
+
+
+def test_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise nose.plugins.skip.SkipTest("NumPy is not available")
+
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.eval_block('import numpy')
+    for arr in [numpy.arange(10.), numpy.zeros(0), numpy.arange(10)[::-1],
+                numpy.arange(2 ** 16, dtype='i2').reshape(256, 256)[::2, ::3],
+                numpy.asfortranarray(numpy.ones((256, 256)))]:
+        ret = py.call('lambda x: x', arr)
+        assert(ret.dtype == arr.dtype)
+        assert(ret.shape == arr.shape)
+        assert((ret == arr).all())
+
+    # large arrays can be modified in place, whether they are sent through
+    # shared memory or not
+    for shm in [None, 0]:
+        py = bond.make_bond('Python', shm=shm, timeout=TIMEOUT)
+        py.eval_block('def inc(x):\n    x += 1\n    return x')
+        ret = py.call('inc', numpy.zeros(1 << 20))
+        assert((ret == 1).all())
+        py.close()
+
+
+def test_buf_size_large():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    for size in [2 ** n for n in range(16, 25, 2)]:
+        print("testing return value >= {} bytes".format(size))
+        ret = py.eval("'x' * {}".format(size))
+        assert(len(ret) == size)
+    assert(py.eval('1') == 1)
+
 
 def test_ref_basic():
     py = bond.make_bond('Python', timeout=TIMEOUT)
@@ -605,3 +745,252 @@ def test_ref_call():
     py.eval_block(r'func = lambda x: x')
     ret = py.call('hasattr', py.ref('func'), '__call__')
     assert(ret == True)
+
+
+def test_ref_reuse():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.eval_block('x = 1')
+
+    # references are evaluated again on each call
+    ref = py.ref('x + 1')
+    assert(py.call('str', ref) == '2')
+    py.eval_block('x = 2')
+    assert(py.call('str', ref) == '3')
+    futs = [py.call_async('str', ref) for i in range(10)]
+    assert([fut.result() for fut in futs] == ['3'] * 10)
+
+    # errors are raised on each use
+    ref = py.ref('x +')
+    for i in range(2):
+        failed = False
+        try:
+            py.call('str', ref)
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+    if 'REF' in py._features:
+        # the code is only sent until registered, then released
+        del ref
+        gc.collect()
+        slots = py.eval('len(__BOND_REFS)')
+        ref = py.ref('x')
+        py.call('str', ref)
+        assert(py._xarg(ref) == [3, ref._slot])
+        assert(py.eval('len(__BOND_REFS)') == slots + 1)
+        del ref
+        gc.collect()
+        assert(py.eval('len(__BOND_REFS)') == slots)
+
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_call_async():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+
+    # pipelined requests are answered in order
+    futs = [py.call_async('str', i) for i in range(100)]
+    assert([fut.result() for fut in futs] == [str(i) for i in range(100)])
+
+    # errors are reported per request
+    futs = [py.call_async('int', x) for x in ['1', 'x', '3']]
+    assert(futs[0].result() == 1)
+    failed = False
+    try:
+        futs[1].result()
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+    assert(futs[2].result() == 3)
+
+    # mix with synchronous calls
+    futs = [py.call_async('str', i) for i in range(10)]
+    assert(py.call('str', 10) == '10')
+    assert([fut.result() for fut in futs] == [str(i) for i in range(10)])
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_call_async_callback():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+
+    # remote functions calling us back, with requests still in flight
+    def local_add(x):
+        return py.call('lambda x: x + 1', x) + 1
+
+    py.export(local_add)
+    py.eval_block(r'''def remote_add(x):
+        return local_add(x) + 1
+    ''')
+    futs = [py.call_async('remote_add', i) for i in range(20)]
+    futs.append(py.call_async('str', 42))
+    assert([fut.result() for fut in futs[:-1]] == [i + 3 for i in range(20)])
+    assert(futs[-1].result() == '42')
+    assert(py.call('remote_add', 0) == 3)
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_call_async_threads():
+    import threading
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+
+    # requests issued by other threads during a callback are held back
+    started = threading.Event()
+    queued = threading.Event()
+    futs = []
+    def local_wait():
+        started.set()
+        queued.wait()
+        return py.call('str', 1)
+
+    def other():
+        started.wait()
+        futs.append(py.call_async('str', 2))
+        queued.set()
+
+    py.export(local_wait)
+    thread = threading.Thread(target=other)
+    thread.start()
+    assert(py.call('local_wait') == '1')
+    thread.join()
+    assert(futs[0].result() == '2')
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_shared_threads():
+    import threading
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+
+    # callbacks run in the thread which issued the request
+    local = threading.local()
+    def local_name(x):
+        assert(local.x == x)
+        return py.call('str', x)
+
+    py.export(local_name)
+    py.eval_block(r'''def remote_name(x):
+        return local_name(x) + "!"
+    ''')
+    results = {}
+    def worker(i):
+        for j in range(20):
+            local.x = i * j
+            results[i, j] = py.call('remote_name', i * j)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert(results == dict(((i, j), str(i * j) + "!") for i in range(8) for j in range(20)))
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_call_many():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+
+    # results are returned in order, across multiple chunks
+    ret = py.call_many('str', [(i,) for i in range(25)], chunksize=10)
+    assert(ret == [str(i) for i in range(25)])
+    assert(py.call_many('str', []) == [])
+
+    # arguments can be any iterable
+    ret = py.call_many('lambda x, y: x + y', ((i, i) for i in range(5)))
+    assert(ret == [0, 2, 4, 6, 8])
+
+    # exceptions don't abort the batch
+    ret = py.call_many('int', [('1',), ('x',), ('3',)])
+    assert(ret[0] == 1)
+    assert(isinstance(ret[1], bond.RemoteException))
+    assert(ret[2] == 3)
+    ret = py.call_many('lambda x: (lambda: x) if x else x', [(0,), (1,)])
+    assert(ret[0] == 0)
+    assert(isinstance(ret[1], bond.SerializationException))
+
+    # references are supported as well
+    py.eval_block('x = 1')
+    ret = py.call_many('lambda x, y: x + y', [(1, 1), (py.ref('x'), 2)])
+    assert(ret == [2, 3])
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_call_by_ref():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.eval_block('def make_list(n): return list(range(n))')
+
+    # handles can be passed back as arguments, fetched or indexed
+    ret = py.call('make_list', 100, by_ref=True)
+    assert(isinstance(ret, bond.RemoteHandle))
+    assert(ret[42] == 42)
+    assert(py.call('len', ret) == 100)
+    assert(py.call('sum', ret, 1) == 4951)
+    assert(ret.fetch() == list(range(100)))
+
+    if 'HANDLE' in py._features:
+        # remote values are released along with the local handle
+        py.eval_block(r'''if True:
+        import weakref
+        class Obj(object): pass
+        def make_obj():
+            global obj_ref
+            obj = Obj()
+            obj_ref = weakref.ref(obj)
+            return obj
+        ''')
+        ret = py.call('make_obj', by_ref=True)
+        assert(py.eval('obj_ref() is not None'))
+        del ret
+        gc.collect()
+        assert(py.eval('obj_ref() is None'))
+
+        # handles are bound to their bond
+        other = bond.make_bond('Python', timeout=TIMEOUT)
+        failed = False
+        try:
+            other.call('len', py.call('make_list', 1, by_ref=True))
+        except bond.BondException as e:
+            print(e)
+            failed = True
+        assert(failed)
+        other.close()
+
+    assert(bond_repl_depth(py) == 1)
+
+
+def test_fork():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    if 'FORK' not in py._features:
+        raise nose.plugins.skip.SkipTest("fork is not supported by the driver")
+
+    # the child starts with a copy of the current state
+    py.eval_block('import os; x = 42')
+    child = py.fork()
+    assert(child.eval('x') == 42)
+    assert(child.eval('os.getpid()') != py.eval('os.getpid()'))
+    child.eval_block('x = 1')
+    assert(py.eval('x') == 42)
+    assert(child.eval('x') == 1)
+
+    # both can call us back
+    def local_add(x):
+        return x + 1
+    py.export(local_add)
+    child2 = py.fork()
+    assert(child2.call('local_add', 1) == 2)
+    assert(py.call('local_add', 2) == 3)
+
+    # stderr is redirected to the child's socket as well
+    assert(child.eval('os.path.samestat(os.fstat(1), os.fstat(2))'))
+
+    child.close()
+    child2.close()
+    assert(py.eval('x') == 42)
+
+    # the children are not left to the template, whose own children can
+    # still be waited for
+    py.eval_block('import subprocess')
+    assert(py.eval('subprocess.Popen(["sh", "-c", "exit 3"]).wait()') == 3)
+    try:
+        py.call('os.waitpid', -1, os.WNOHANG)
+        assert(False)
+    except bond.RemoteException:
+        pass
+    assert(bond_repl_depth(py) == 1)
@@ -0,0 +1,6 @@
+import sys
+from tests import *
+
+# asyncio tests require a recent python version
+if sys.version_info >= (3, 7):
+    from tests._aio import *
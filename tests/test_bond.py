@@ -1,5 +1,12 @@
 from __future__ import print_function
 import bond
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from tests import *
 
 def test_ser_err():
@@ -52,6 +59,96 @@ def test_proxy():
     assert(py2.call('func_py1', 0) == 1)
 
 
+def test_proxy_direct():
+    py1 = bond.make_bond('Python', timeout=TIMEOUT)
+    py1.eval_block(r'''def func_py1(arg):
+        if arg < 0: raise ValueError("negative")
+        return arg + 1
+    ''')
+
+    # falls back to a regular proxy when not supported
+    py2 = bond.make_bond('Python', timeout=TIMEOUT)
+    py1.proxy('func_py1', py2, 'func', direct=True)
+    py2.eval_block(r'''def loop(n):
+        for i in range(n):
+            n = func(n)
+        return n
+    ''')
+    assert(py2.call('func', 0) == 1)
+    assert(py2.call('loop', 10) == 20)
+    if 'LINK' in py1._features:
+        # calls don't go through the exported function
+        assert(py2.eval('func.__name__') == 'call')
+
+    failed = False
+    try:
+        py2.call('func', -1)
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    # the caller remains usable afterwards
+    assert(py1.call('func_py1', 1) == 2)
+    assert(py2.call('func', 1) == 2)
+
+    if 'LINK' in py1._features:
+        # the listener is closed when the other side can't connect
+        py3 = bond.make_bond('Python', timeout=TIMEOUT)
+        py3.eval_block('def __BOND_link(*args): raise Exception("refused")')
+        py1.proxy('func_py1', py3, 'func', direct=True)
+        assert(py1.eval('len(__BOND_LINKS)') == 1)
+        assert(py3.call('func', 1) == 2)
+
+
+def test_proxy_relay():
+    py1 = bond.make_bond('Python', protocol='JSON', timeout=TIMEOUT)
+    py1.eval_block(r'''def func_py1(*args):
+        if not args: raise ValueError("no arguments")
+        return list(args)
+    ''')
+
+    # calls between bonds using the same protocol are relayed as-is
+    py2 = bond.make_bond('Python', protocol='JSON', timeout=TIMEOUT)
+    py1.proxy('func_py1', py2, 'func')
+    args = [1, u'è "quoted" ]', {'a': [None]}]
+    assert(py2.call('func', *args) == args)
+    assert(py2.relayed > 0)
+
+    failed = False
+    try:
+        py2.call('func')
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    # results which can't be serialized fail like any other exception
+    py1.eval_block('def func_obj(): return object()')
+    py1.proxy('func_obj', py2)
+    failed = False
+    try:
+        py2.call('func_obj')
+    except bond.RemoteException as e:
+        print(e)
+        failed = True
+    assert(failed)
+    assert(py2.call('func', 1) == [1])
+
+    # other bindings are unaffected
+    py2.export(lambda x: x + 1, 'local')
+    assert(py2.call('local', 1) == 2)
+    relayed = py2.relayed
+    py2.export(lambda *args: None, 'func')
+    assert(py2.call('func', 1) is None)
+    assert(py2.relayed == relayed)
+
+    py3 = bond.make_bond('Python', protocol='PICKLE', timeout=TIMEOUT)
+    py1.proxy('func_py1', py3)
+    assert(py3.call('func_py1', 1) == [1])
+    assert(py3.relayed == 0)
+
+
 def test_ref_xref():
     py1 = bond.make_bond('Python', timeout=TIMEOUT)
     py2 = bond.make_bond('Python', timeout=TIMEOUT)
@@ -68,3 +165,333 @@ def test_ref_xref():
 def test_list_drivers():
     drivers = bond.list_drivers()
     assert('Python' in drivers)
+
+
+def test_driver_cache():
+    tmp = tempfile.mkdtemp()
+    drivers_path = bond._driver_path()
+    try:
+        shutil.copytree(bond._driver_path('Python'), os.path.join(tmp, 'Python'))
+        bond._drivers_path = tmp
+        assert(bond.list_drivers() == ['Python'])
+        data = bond.query_driver('Python')
+        assert(bond.query_driver('Python') == data)
+
+        # drivers are reloaded as soon as they're modified
+        data['init']['probe'] = 'print("STAGE" + "1")'
+        with open(os.path.join(tmp, 'Python', 'bond.json'), 'w') as fd:
+            json.dump(data, fd)
+        assert(bond.query_driver('Python') == data)
+        py = bond.make_bond('Python', timeout=TIMEOUT)
+        assert(py.eval('1') == 1)
+        py.close()
+
+        os.mkdir(os.path.join(tmp, 'Test'))
+        shutil.copy(os.path.join(tmp, 'Python', 'bond.json'), os.path.join(tmp, 'Test'))
+        assert(sorted(bond.list_drivers()) == ['Python', 'Test'])
+    finally:
+        bond._drivers_path = drivers_path
+        shutil.rmtree(tmp)
+
+
+def test_lazy_import():
+    if sys.version_info < (3, 7):
+        raise nose.plugins.skip.SkipTest("lazy imports require Python 3.7")
+    slow = ['pexpect', 'pkg_resources', 'concurrent.futures', 'multiprocessing']
+    code = 'import bond, sys; print(" ".join(sys.modules))'
+    modules = subprocess.check_output([sys.executable, '-c', code]).decode('utf-8').split()
+    assert(not set(slow) & set(modules))
+
+
+def test_transport():
+    failed = False
+    try:
+        bond.make_bond('Python', transport='invalid', timeout=TIMEOUT)
+    except bond.BondException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    py = bond.make_bond('Python', transport='pipe', timeout=TIMEOUT)
+    assert(isinstance(py._proc, bond.Pipe))
+    assert(py.eval('1') == 1)
+
+    # no timeout at all
+    py = bond.make_bond('Python', timeout=None)
+    assert(py.eval('1') == 1)
+
+
+def test_lazy():
+    bonds = [bond.make_bond('Python', lazy=True, timeout=TIMEOUT) for i in range(3)]
+    for py in bonds:
+        assert(isinstance(py, bond.Bond))
+    for i, py in enumerate(bonds):
+        assert(py.call('str', i) == str(i))
+        assert('stage2' in py.startup)
+        py.close()
+
+    # attributes assigned before the initialization is complete are kept
+    py = bond.make_bond('Python', lazy=True, timeout=TIMEOUT)
+    out = io.StringIO()
+    py.channels = {'STDOUT': out, 'STDERR': sys.stderr}
+    py.eval_block('print("lazy")')
+    assert(py.channels['STDOUT'] is out)
+    assert(out.getvalue() == 'lazy\n')
+    py.close()
+
+    # initialization errors are raised on first use
+    py = bond.make_bond('Python', 'false', lazy=True, timeout=TIMEOUT)
+    failed = False
+    try:
+        py.eval('1')
+    except bond.BondException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+
+def test_make_bonds():
+    # the pipelined stage2 is written without blocking on any interpreter
+    import bond.transports
+    def sendline_timeout(self, s, timeout):
+        raise AssertionError('blocking write')
+    saved = bond.transports.Spawn.sendline_timeout
+    bond.transports.Spawn.sendline_timeout = sendline_timeout
+    try:
+        bonds = bond.make_bonds('Python', 3, timeout=TIMEOUT)
+    finally:
+        bond.transports.Spawn.sendline_timeout = saved
+    assert(len(bonds) == 3)
+    pids = set(py.eval('__import__("os").getpid()') for py in bonds)
+    assert(len(pids) == 3)
+    for py in bonds:
+        py.close()
+
+    # failures are either raised or reported in place
+    failed = False
+    try:
+        bond.make_bonds('Python', 2, 'false', timeout=TIMEOUT)
+    except bond.BondException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+    bonds = bond.make_bonds('Python', 2, 'false', partial=True, timeout=TIMEOUT)
+    assert(all(isinstance(e, bond.BondException) for e in bonds))
+
+    # no timeout at all
+    bonds = bond.make_bonds('Python', 2, timeout=None)
+    assert([py.eval('1') for py in bonds] == [1, 1])
+    for py in bonds:
+        py.close()
+
+
+def test_framing():
+    py = bond.make_bond('Python', framing='LINE', timeout=TIMEOUT)
+    assert(py._framing is bond.framings.LINE)
+    assert(py.eval('1') == 1)
+
+    failed = False
+    try:
+        bond.make_bond('Python', framing='invalid', timeout=TIMEOUT)
+    except bond.BondException as e:
+        print(e)
+        failed = True
+    assert(failed)
+
+
+def test_reader_resume():
+    # a message interrupted by a timeout can be read again later
+    import pexpect
+    class Proc(object):
+        buffer = b''
+        string_type = bytes
+        logfile = logfile_read = None
+        timeout = 0.1
+    proc = Proc()
+    proc.child_fd, write_fd = os.pipe()
+    try:
+        reader = bond.framings.Reader(proc, chunk_size=16)
+        payload = b'x' * 1024
+        msg = bond.framings.HEADER.pack(bond.framings.CODES['RETURN'], len(payload)) + payload
+        os.write(write_fd, msg[:512])
+        failed = False
+        try:
+            bond.framings.BINARY.recv(reader)
+        except pexpect.TIMEOUT:
+            failed = True
+        assert(failed)
+        os.write(write_fd, msg[512:])
+        assert(bond.framings.BINARY.recv(reader) == ('RETURN', payload))
+    finally:
+        os.close(proc.child_fd)
+        os.close(write_fd)
+
+
+def test_logfile():
+    logfile = io.BytesIO()
+    py = bond.make_bond('Python', logfile=logfile, timeout=TIMEOUT)
+    assert(py.eval('"logged"') == "logged")
+    assert(b'logged' in logfile.getvalue())
+
+
+def test_protocols():
+    data = [None, 1, u"String", b"\n\0", [1, {u"a": (1, 2)}], bytearray(2 ** 20)]
+    for name in bond.PROTO:
+        if name == 'JSON': continue
+        proto = getattr(bond.protocols, name)
+        assert(proto.loads(proto.dumps(data)) == data)
+
+    # out-of-band buffers
+    if 'PICKLE5' in bond.PROTO:
+        data = memoryview(b"x" * 2 ** 20)
+        proto = bond.protocols.PICKLE5
+        assert(proto.loads(proto.dumps(data)) == data)
+
+        # and written out without being copied
+        data = bytearray(2 ** 20)
+        chunks = proto.dumps(memoryview(data))
+        data[0] = 1
+        assert(bytes(chunks[-1][:1]) == b'\x01')
+
+
+def test_shm():
+    for proto in ['JSON', None]:
+        logfile = io.BytesIO()
+        py = bond.make_bond('Python', shm=1024, protocol=proto, logfile=logfile, timeout=TIMEOUT)
+        assert(py._shm is not None)
+        for size in [2 ** 9, 2 ** 10, 2 ** 20]:
+            buf = "x" * size
+            assert(py.call('str', buf) == buf)
+
+        # large payloads never go through the terminal
+        assert(b'x' * 2 ** 11 not in logfile.getvalue())
+        py.close()
+
+    # a threshold of 0 disables it
+    py = bond.make_bond('Python', shm=0, timeout=TIMEOUT)
+    assert(py._shm is None)
+    assert(py.call('str', 1) == '1')
+
+    # never enabled through remote shells
+    assert(bond._remote_shell('ssh localhost python'))
+    assert(not bond._remote_shell('python'))
+
+
+def test_pool():
+    with bond.BondPool('Python', 3, init_block='import os', timeout=TIMEOUT) as pool:
+        assert(len(pool.bonds) == 3)
+
+        # calls are distributed among all workers
+        pids = pool.map('lambda x: os.getpid()', range(30))
+        assert(len(pids) == 30)
+        assert(len(set(pids)) == 3)
+        assert(pool.map('str', range(100)) == [str(i) for i in range(100)])
+        assert(pool.map('max', [1, 5], [4, 2]) == [4, 5])
+
+        # exceptions are reported to the caller
+        failed = False
+        try:
+            pool.call('int', 'x')
+        except bond.RemoteException as e:
+            print(e)
+            failed = True
+        assert(failed)
+
+        # concurrent callers
+        import threading
+        results = {}
+        def worker(i):
+            results[i] = pool.call('str', i)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(10)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        assert(results == dict((i, str(i)) for i in range(10)))
+        assert(pool.submit('str', 1).result() == '1')
+
+
+def test_executor():
+    executor = bond.BondExecutor('Python', 2, setup='import os',
+                                 max_calls_per_worker=5, timeout=TIMEOUT)
+    futs = [executor.submit('str', i) for i in range(20)]
+    assert([fut.result() for fut in futs] == [str(i) for i in range(20)])
+    assert(list(executor.map('max', [1, 5], [4, 2])) == [4, 5])
+
+    # workers are recycled
+    pids = set(executor.map('lambda x: os.getpid()', range(20)))
+    assert(len(pids) >= 4)
+
+    # setup functions
+    def setup(py):
+        py.eval_block('x = 42')
+    with bond.BondExecutor('Python', 1, setup=setup, timeout=TIMEOUT) as other:
+        assert(other.submit('eval', 'x').result() == 42)
+
+    # no new calls after shutdown
+    futs = [executor.submit('str', i) for i in range(10)]
+    executor.shutdown()
+    assert(all(fut.done() for fut in futs))
+    failed = False
+    try:
+        executor.submit('str', 1)
+    except RuntimeError as e:
+        failed = True
+    assert(failed)
+
+
+def test_fork_server():
+    server = bond.ForkServer('Python', preload='x = 42', timeout=TIMEOUT)
+    bonds = [server.make_bond() for i in range(3)]
+    for py in bonds:
+        assert(py.eval('x') == 42)
+        py.close()
+    server.close()
+
+    with bond.BondPool('Python', 2, init_block='import os', fork=True, timeout=TIMEOUT) as pool:
+        pids = pool.map('lambda x: os.getpid()', range(10))
+        assert(len(set(pids)) == 2)
+
+
+def test_stats():
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.export(lambda x: x, 'echo')
+    py.eval_block(r'''def func(x):
+        return echo(echo(x))
+    ''')
+    for i in range(10):
+        assert(py.call('func', i) == i)
+    assert(py.call_many('str', [(i,) for i in range(5)]) == [str(i) for i in range(5)])
+
+    stats = py.stats()
+    print(stats)
+    assert(stats['calls'] == 15)
+    assert(stats['evals'] == 1)
+    assert(stats['bytes_sent'] > 0 and stats['bytes_received'] > 0)
+    assert(stats['dumps_time'] > 0 and stats['loads_time'] > 0)
+    assert(stats['wait_time'] > 0)
+    assert(stats['depth'] == 0 and stats['max_depth'] == 1)
+    assert(stats['callbacks']['echo']['calls'] == 20)
+    assert(stats['pid'] == py._proc.pid)
+    assert(any(x['pid'] == py._proc.pid for x in bond.stats()))
+
+
+def test_metrics():
+    try:
+        from urllib.request import urlopen
+    except ImportError:
+        from urllib2 import urlopen
+
+    py = bond.make_bond('Python', timeout=TIMEOUT)
+    py.export(lambda: None, 'cb')
+    py.eval('cb()')
+    server = bond.serve_metrics()
+    try:
+        url = 'http://127.0.0.1:{port}/metrics'.format(port=server.server_address[1])
+        text = urlopen(url, timeout=TIMEOUT).read().decode('utf-8')
+    finally:
+        server.close()
+    labels = '{{lang="Python",pid="{pid}"}}'.format(pid=py._proc.pid)
+    assert('bond_evals_total' + labels + ' 1.0' in text)
+    assert('# TYPE bond_wait_seconds_total counter' in text)
+    assert('bond_callback_calls_total{{lang="Python",name="cb",pid="{pid}"}} 1.0'.format(
+        pid=py._proc.pid) in text)